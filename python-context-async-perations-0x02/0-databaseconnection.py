@@ -1,5 +1,7 @@
 import sqlite3
 
+from db_pool import PooledDatabaseConnection, get_pool
+
 class DatabaseConnection:
     def __init__(self, db_name):
         self.db_name = db_name
@@ -13,21 +15,30 @@ class DatabaseConnection:
         if self.conn:
             self.conn.close()
 
-# Create the table and add some dummy data if needed
-with DatabaseConnection("users.db") as conn:
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL
-        );
-    ''')
-    cursor.execute('INSERT INTO users (name) VALUES (?)', ('John Doe',))
-    conn.commit()
-
-# Now fetch the users
-with DatabaseConnection("users.db") as conn:
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM users")
-    results = cursor.fetchall()
-    print(results)
+
+if __name__ == "__main__":
+    # Create the table and add some dummy data if needed
+    with DatabaseConnection("users.db") as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL
+            );
+        ''')
+        cursor.execute('INSERT INTO users (name) VALUES (?)', ('John Doe',))
+        conn.commit()
+
+    # Now fetch the users
+    with DatabaseConnection("users.db") as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM users")
+        results = cursor.fetchall()
+        print(results)
+
+    # Same read through the pool; the nested block reuses the connection
+    with PooledDatabaseConnection("users.db") as conn:
+        with PooledDatabaseConnection("users.db") as inner:
+            assert inner is conn
+            print(inner.execute("SELECT COUNT(*) FROM users").fetchone())
+    print(get_pool("users.db").stats())
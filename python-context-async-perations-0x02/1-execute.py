@@ -1,26 +1,75 @@
+import dataclasses
 import sqlite3
 
 class ExecuteQuery:
-    def __init__(self, db_name, query, params=None):
+    """Run a query for the life of a `with` block.
+
+    By default the block gets every row as a list. With stream=True it
+    gets an iterator instead: rows are pulled `arraysize` at a time via
+    fetchmany() while the cursor stays open, so memory stays flat however
+    large the result is. chunked=True yields each fetchmany() batch as a
+    list rather than row by row.
+
+    row_factory picks the row type: None for tuples, sqlite3.Row, a
+    dataclass whose fields match the selected columns, or any
+    sqlite3-style (cursor, row) callable.
+    """
+
+    def __init__(self, db_name, query, params=None, stream=False,
+                 arraysize=1000, chunked=False, row_factory=None):
         self.db_name = db_name
         self.query = query
         self.params = params if params else ()
+        self.stream = stream
+        self.arraysize = arraysize
+        self.chunked = chunked
+        self.row_factory = row_factory
         self.conn = None
         self.cursor = None
 
+    def _factory(self):
+        factory = self.row_factory
+        if dataclasses.is_dataclass(factory) and isinstance(factory, type):
+            return lambda cursor, row: factory(*row)
+        return factory
+
+    def _chunks(self):
+        while True:
+            rows = self.cursor.fetchmany()
+            if not rows:
+                return
+            yield rows
+
+    def _rows(self):
+        for rows in self._chunks():
+            yield from rows
+
     def __enter__(self):
         self.conn = sqlite3.connect(self.db_name)
+        self.conn.row_factory = self._factory()
         self.cursor = self.conn.cursor()
+        self.cursor.arraysize = self.arraysize
         self.cursor.execute(self.query, self.params)
-        return self.cursor.fetchall()
+        if not self.stream:
+            return self.cursor.fetchall()
+        return self._chunks() if self.chunked else self._rows()
 
     def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.cursor:
+            self.cursor.close()
         if self.conn:
             self.conn.close()
 
 # Example usage
-query = "SELECT * FROM users WHERE age > ?"
-params = (25,)
+if __name__ == "__main__":
+    query = "SELECT * FROM users WHERE age > ?"
+    params = (25,)
+
+    with ExecuteQuery("users.db", query, params) as results:
+        print(results)
 
-with ExecuteQuery("users.db", query, params) as results:
-    print(results)
+    # Same query, streamed as sqlite3.Row objects
+    with ExecuteQuery("users.db", query, params, stream=True,
+                      row_factory=sqlite3.Row) as rows:
+        for row in rows:
+            print(dict(row))
@@ -1,29 +1,56 @@
 import aiosqlite
 import asyncio
 
+from async_pool import ReadWritePool, run_queries
+
+# One-off connection, or a pooled one routed by statement when a
+# ReadWritePool is given (SELECTs go to its read-only connections)
+def connect(pool, query):
+    if pool is None:
+        return aiosqlite.connect("users.db")
+    return pool.for_query(query).connection()
+
 # Async function to fetch all users
-async def async_fetch_users():
-    async with aiosqlite.connect("users.db") as db:
-        async with db.execute("SELECT * FROM users") as cursor:
+async def async_fetch_users(pool=None):
+    query = "SELECT * FROM users"
+    async with connect(pool, query) as db:
+        async with db.execute(query) as cursor:
             users = await cursor.fetchall()
             print("All users:", users)
             return users
 
 # Async function to fetch users older than 40
-async def async_fetch_older_users():
-    async with aiosqlite.connect("users.db") as db:
-        async with db.execute("SELECT * FROM users WHERE age > 40") as cursor:
+async def async_fetch_older_users(pool=None):
+    query = "SELECT * FROM users WHERE age > 40"
+    async with connect(pool, query) as db:
+        async with db.execute(query) as cursor:
             older_users = await cursor.fetchall()
             print("Users older than 40:", older_users)
             return older_users
 
 # Function to run both queries concurrently
-async def fetch_concurrently():
+async def fetch_concurrently(pool=None):
     await asyncio.gather(
-        async_fetch_users(),
-        async_fetch_older_users()
+        async_fetch_users(pool),
+        async_fetch_older_users(pool)
     )
 
+# Fan out any number of queries over a shared pool, at most `concurrency`
+# at a time, collecting results as they complete
+async def fetch_reports(queries, concurrency=8, timeout=None, pool=None):
+    results = [None] * len(queries)
+    async for result in run_queries(queries, "users.db", concurrency,
+                                    timeout=timeout, pool=pool):
+        results[result.index] = result
+    return results
+
 # Run the main async function
+async def main():
+    await fetch_concurrently()
+
+    # Same reads spread over two read-only connections
+    async with ReadWritePool("users.db", readers=2) as pool:
+        await fetch_concurrently(pool)
+
 if __name__ == "__main__":
-    asyncio.run(fetch_concurrently())
+    asyncio.run(main())
@@ -0,0 +1,304 @@
+"""Shared aiosqlite connection pool and a bounded-concurrency query runner.
+
+run_queries() fans a list (or async stream) of queries out over a pool,
+never running more than `concurrency` of them at once, and yields each
+result as soon as it is ready:
+
+    async for result in run_queries(queries, "users.db", concurrency=16,
+                                    timeout=5):
+        print(result.index, result.rows or result.error)
+
+Pass a ReadWritePool as `pool` to spread SELECTs over read-only
+connections while writes go through a single writer.
+"""
+import asyncio
+import contextlib
+import pathlib
+import re
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import aiosqlite
+
+from db_pool import PoolTimeout
+
+
+class AsyncConnectionPool:
+    """Bounded LIFO pool of aiosqlite connections, for one event loop.
+
+    Connections are opened lazily, up to `size`, so the number of open
+    file handles never exceeds it however many queries are queued.
+    readonly=True opens them with a mode=ro URI and PRAGMA query_only, so
+    they can never take a write lock.
+    """
+
+    def __init__(self, database="users.db", size=8, timeout=30.0,
+                 readonly=False, pragmas=None):
+        self.database = database
+        self.size = size
+        self.timeout = timeout
+        self.readonly = readonly
+        self.pragmas = dict(pragmas or {})
+        if readonly:
+            self.pragmas["query_only"] = "ON"
+        self._idle = []
+        self._slots = asyncio.Semaphore(size)
+        self._stats = dict.fromkeys(
+            ("created", "checkouts", "timeouts", "in_use"), 0)
+
+    async def _connect(self):
+        if self.readonly:
+            uri = pathlib.Path(self.database).resolve().as_uri() + "?mode=ro"
+            conn = await aiosqlite.connect(uri, uri=True)
+        else:
+            conn = await aiosqlite.connect(self.database)
+        for name, value in self.pragmas.items():
+            await conn.execute(f"PRAGMA {name} = {value}")
+        self._stats["created"] += 1
+        return conn
+
+    async def checkout(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout)
+        except asyncio.TimeoutError:
+            self._stats["timeouts"] += 1
+            raise PoolTimeout(
+                f"No connection to {self.database} free after {timeout}s"
+            ) from None
+        try:
+            conn = self._idle.pop() if self._idle else await self._connect()
+        except BaseException:
+            self._slots.release()
+            raise
+        self._stats["checkouts"] += 1
+        self._stats["in_use"] += 1
+        return conn
+
+    async def release(self, conn):
+        try:
+            if conn.in_transaction:
+                await conn.rollback()
+            self._idle.append(conn)
+        except sqlite3.Error:
+            await conn.close()
+        finally:
+            self._stats["in_use"] -= 1
+            self._slots.release()
+
+    @contextlib.asynccontextmanager
+    async def connection(self, timeout=None):
+        conn = await self.checkout(timeout)
+        try:
+            yield conn
+        finally:
+            await self.release(conn)
+
+    async def close(self):
+        while self._idle:
+            await self._idle.pop().close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    def for_query(self, query):
+        """Pool to run `query` on; a plain pool runs everything itself."""
+        return self
+
+    def stats(self):
+        return dict(self._stats, idle=len(self._idle))
+
+
+_READ_RE = re.compile(r"^\s*(?:SELECT|EXPLAIN)\b", re.I)
+_WRITE_RE = re.compile(r"\b(?:INSERT|UPDATE|DELETE|REPLACE)\b", re.I)
+
+
+def is_read(query):
+    """True for statements a read-only connection can run."""
+    if re.match(r"^\s*WITH\b", query, re.I):
+        return not _WRITE_RE.search(query)
+    return bool(_READ_RE.match(query))
+
+
+class ReadWritePool:
+    """`readers` read-only connections plus a single writer, in WAL mode.
+
+    WAL lets any number of readers run alongside the one writer, so
+    SELECTs fan out over the read pool while writes queue for the writer
+    instead of fighting over the lock and failing with "database is
+    locked". for_query() picks the side for a statement, which is how
+    execute() and run_queries() route through it.
+    """
+
+    def __init__(self, database="users.db", readers=4, timeout=30.0,
+                 busy_timeout=5000):
+        self.database = database
+        self.writer = AsyncConnectionPool(
+            database, size=1, timeout=timeout,
+            pragmas={"journal_mode": "WAL", "busy_timeout": busy_timeout})
+        self.readers = AsyncConnectionPool(
+            database, size=readers, timeout=timeout, readonly=True,
+            pragmas={"busy_timeout": busy_timeout})
+
+    async def open(self):
+        """Switch the file to WAL before the first reader connects."""
+        async with self.writer.connection():
+            pass
+        return self
+
+    def for_query(self, query):
+        return self.readers if is_read(query) else self.writer
+
+    async def close(self):
+        await self.readers.close()
+        await self.writer.close()
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    def stats(self):
+        return {"readers": self.readers.stats(),
+                "writer": self.writer.stats()}
+
+
+@dataclass
+class QueryResult:
+    """Outcome of one query; exactly one of rows and error is set."""
+    index: int
+    query: str
+    params: tuple
+    rows: Optional[list] = None
+    error: Optional[BaseException] = None
+    elapsed: float = 0.0
+
+
+def _split(item):
+    """Accept "SQL" or ("SQL", params)."""
+    if isinstance(item, str):
+        return item, ()
+    query, params = item
+    return query, tuple(params)
+
+
+async def _interrupt(conn, task):
+    """Interrupt `task`'s statement until it stops, leaving conn idle.
+
+    A single interrupt() is lost if it lands before the statement starts
+    on the connection's worker thread, so keep trying until it ends.
+    """
+    while not task.done():
+        await conn.interrupt()
+        await asyncio.wait({task}, timeout=0.05)
+    if not task.cancelled():
+        task.exception()
+
+
+async def execute(pool, query, params=(), timeout=None):
+    """Run one query on a pooled connection and fetch every row.
+
+    Past `timeout` seconds the statement is interrupted inside SQLite,
+    so the connection goes back to the pool free rather than grinding
+    on a query nobody is waiting for, and asyncio.TimeoutError is
+    raised. Cancelling the caller interrupts the statement the same way.
+    Writes are committed before the connection is returned.
+    """
+    async with pool.for_query(query).connection() as conn:
+        async def fetch():
+            async with conn.execute(query, params) as cursor:
+                rows = await cursor.fetchall()
+            if conn.in_transaction:
+                await conn.commit()
+            return rows
+        task = asyncio.ensure_future(fetch())
+        try:
+            done, _ = await asyncio.wait({task}, timeout=timeout)
+        except asyncio.CancelledError:
+            await _interrupt(conn, task)
+            raise
+        if not done:
+            await _interrupt(conn, task)
+            raise asyncio.TimeoutError(f"Query exceeded {timeout}s: {query}")
+        return task.result()
+
+
+async def _items(queries):
+    if hasattr(queries, "__aiter__"):
+        async for item in queries:
+            yield item
+    else:
+        for item in queries:
+            yield item
+
+
+async def run_queries(queries, database="users.db", concurrency=8,
+                      timeout=None, pool=None, return_exceptions=True):
+    """Run `queries` concurrently, yielding QueryResults as they finish.
+
+    `queries` is an iterable or async iterable of "SQL" strings or
+    ("SQL", params) pairs; it is consumed lazily, so at most
+    `concurrency` queries are pending at once. With return_exceptions
+    false the first failing query's error is raised instead of being
+    reported in its QueryResult. Leaving the loop early (break, error or
+    cancellation) cancels and interrupts whatever is still running.
+    """
+    owns_pool = pool is None
+    if owns_pool:
+        pool = AsyncConnectionPool(database, size=concurrency)
+    pending = asyncio.Queue(maxsize=concurrency)
+    results = asyncio.Queue()
+    done = object()
+
+    async def feed():
+        try:
+            index = 0
+            async for item in _items(queries):
+                await pending.put((index, *_split(item)))
+                index += 1
+        except Exception as exc:
+            # Hand a broken query stream to the consumer to raise.
+            await results.put(exc)
+            return
+        for _ in range(concurrency):
+            await pending.put(done)
+
+    async def worker():
+        while (job := await pending.get()) is not done:
+            index, query, params = job
+            result = QueryResult(index, query, params)
+            start = time.perf_counter()
+            try:
+                result.rows = await execute(pool, query, params, timeout)
+            except Exception as exc:
+                result.error = exc
+            result.elapsed = time.perf_counter() - start
+            await results.put(result)
+        await results.put(done)
+
+    tasks = [asyncio.create_task(feed())]
+    tasks += [asyncio.create_task(worker()) for _ in range(concurrency)]
+    try:
+        running = concurrency
+        while running:
+            result = await results.get()
+            if result is done:
+                running -= 1
+            elif isinstance(result, Exception):
+                raise result
+            elif result.error is not None and not return_exceptions:
+                raise result.error
+            else:
+                yield result
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if owns_pool:
+            await pool.close()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""Peak memory and time of ExecuteQuery: fetchall() vs streaming.
+
+Usage: ./bench_execute.py [rows] [arraysize]
+
+Builds a scratch users table with `rows` rows (5,000,000 by default)
+next to this script, then reads it back once per mode. Peak memory is
+what tracemalloc sees Python allocate while the rows are consumed.
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass
+
+ExecuteQuery = __import__('1-execute').ExecuteQuery
+
+
+@dataclass
+class User:
+    id: int
+    name: str
+    age: int
+
+
+def build(database, rows):
+    conn = sqlite3.connect(database)
+    conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, "
+                 "name TEXT NOT NULL, age INTEGER)")
+    conn.executemany("INSERT INTO users (name, age) VALUES (?, ?)",
+                     ((f"user{i}", 18 + i % 60) for i in range(rows)))
+    conn.commit()
+    conn.close()
+
+
+def measure(database, **options):
+    tracemalloc.start()
+    start = time.perf_counter()
+    total = 0
+    with ExecuteQuery(database, "SELECT id, name, age FROM users WHERE age > ?",
+                      (25,), **options) as rows:
+        for _ in rows:
+            total += 1
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return total, elapsed, peak
+
+
+def main(rows, arraysize):
+    modes = [
+        ("fetchall", {}),
+        ("stream", {"stream": True, "arraysize": arraysize}),
+        ("stream chunked", {"stream": True, "arraysize": arraysize,
+                            "chunked": True}),
+        ("stream Row", {"stream": True, "arraysize": arraysize,
+                        "row_factory": sqlite3.Row}),
+        ("stream dataclass", {"stream": True, "arraysize": arraysize,
+                              "row_factory": User}),
+    ]
+    here = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory(dir=here) as tmp:
+        database = os.path.join(tmp, "users.db")
+        build(database, rows)
+        print(f"{rows} rows, arraysize={arraysize}")
+        for label, options in modes:
+            total, elapsed, peak = measure(database, **options)
+            print(f"{label:>17}: {total} results in {elapsed:6.2f}s, "
+                  f"peak {peak / 2**20:8.1f} MiB")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5_000_000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 1000)
@@ -0,0 +1,159 @@
+"""Batched async inserts for ingestion services.
+
+AsyncBulkWriter buffers rows in a bounded queue and a background task
+writes them with executemany(), one transaction per batch. A batch is
+flushed once it holds `batch_size` rows or its first row has waited
+`flush_interval` seconds, whichever comes first. When the buffer is full,
+put() waits, so a fast producer is slowed to the rate the database can
+sustain instead of growing memory without bound.
+
+    async with ReadWritePool("users.db") as pool:
+        async with AsyncBulkWriter(pool) as writer:
+            await writer.write_all(rows)   # any async iterator of tuples
+"""
+import asyncio
+import time
+
+_CLOSE = object()
+
+
+class AsyncBulkWriter:
+    """Write rows through `pool`'s writer in executemany() batches.
+
+    `pool` is a ReadWritePool or AsyncConnectionPool from async_pool; the
+    statement is routed like any other write. Rows are tuples, or dicts
+    for a statement with named placeholders.
+    """
+
+    def __init__(self, pool, sql="INSERT INTO users (name, age) VALUES (?, ?)",
+                 batch_size=1000, flush_interval=0.5, max_buffer=10000):
+        self.pool = pool
+        self.sql = sql
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = asyncio.Queue(maxsize=max_buffer)
+        self._task = None
+        self._error = None
+        self._stats = dict.fromkeys(("rows", "batches", "full_waits"), 0)
+        self._write_time = 0.0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        return self
+
+    async def put(self, row):
+        """Queue one row, waiting while the buffer is full."""
+        if self._error is not None:
+            raise self._error
+        if self._task is None:
+            self.start()
+        if self._queue.full():
+            self._stats["full_waits"] += 1
+        await self._queue.put(row)
+
+    async def write_all(self, rows):
+        """Queue every row from an async (or plain) iterable."""
+        if hasattr(rows, "__aiter__"):
+            async for row in rows:
+                await self.put(row)
+        else:
+            for row in rows:
+                await self.put(row)
+
+    async def close(self):
+        """Flush what is buffered and stop; re-raises a failed write."""
+        if self._task is not None:
+            if not self._task.done():
+                await self._queue.put(_CLOSE)
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._error is not None:
+            raise self._error
+
+    async def __aenter__(self):
+        return self.start()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is not None and self._task is not None:
+            # Drop what is buffered. The cancelled task no longer reads the
+            # queue, so queueing _CLOSE behind a full buffer would hang.
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            return
+        await self.close()
+
+    async def _collect(self, batch):
+        """Add rows to `batch` until it is full, due, or the writer closes."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            try:
+                # Drain what is already buffered without a timer per row.
+                row = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return False
+                try:
+                    row = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    return False
+            if row is _CLOSE:
+                return True
+            batch.append(row)
+        return False
+
+    async def _flush(self, batch):
+        start = time.perf_counter()
+        async with self.pool.for_query(self.sql).connection() as conn:
+            await conn.executemany(self.sql, batch)
+            await conn.commit()
+        self._write_time += time.perf_counter() - start
+        self._stats["rows"] += len(batch)
+        self._stats["batches"] += 1
+
+    async def _run(self):
+        closing = False
+        try:
+            while not closing:
+                row = await self._queue.get()
+                if row is _CLOSE:
+                    break
+                batch = [row]
+                closing = await self._collect(batch)
+                await self._flush(batch)
+        except Exception as exc:
+            self._error = exc
+            # Unblock producers waiting on a full buffer; they see the
+            # error on their next put().
+            while not self._queue.empty():
+                self._queue.get_nowait()
+
+    def stats(self):
+        stats = dict(self._stats, buffered=self._queue.qsize())
+        stats["rows_per_sec"] = (
+            stats["rows"] / self._write_time if self._write_time else 0.0)
+        return stats
+
+
+if __name__ == "__main__":
+    import sys
+
+    from async_pool import ReadWritePool
+
+    async def rows(count):
+        for i in range(count):
+            yield (f"user{i}", 18 + i % 60)
+
+    async def main(count):
+        async with ReadWritePool("users.db") as pool:
+            start = time.perf_counter()
+            async with AsyncBulkWriter(pool) as writer:
+                await writer.write_all(rows(count))
+            elapsed = time.perf_counter() - start
+            print(f"{count} rows in {elapsed:.2f}s "
+                  f"({count / elapsed:,.0f} rows/s)", writer.stats())
+
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000))
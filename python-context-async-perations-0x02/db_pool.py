@@ -0,0 +1,183 @@
+"""Bounded, thread-safe pool of sqlite3 connections.
+
+PooledDatabaseConnection is the pooled counterpart of DatabaseConnection
+in 0-databaseconnection.py: `with` blocks borrow a connection instead of
+opening a new one, and nested blocks in one thread share it.
+"""
+import queue
+import sqlite3
+import threading
+import time
+
+
+class PoolTimeout(sqlite3.OperationalError):
+    """No pooled connection became free within the checkout timeout."""
+
+
+class ConnectionPool:
+    """Bounded pool of sqlite3 connections to one database file.
+
+    Connections are opened lazily, up to `size`, and handed out most
+    recently used first. stats() reports how long callers waited for a
+    connection and how busy the pool has been since it was created.
+    """
+
+    def __init__(self, db_name, size=4, timeout=30.0, **connect_kwargs):
+        self.db_name = db_name
+        self.size = size
+        self.timeout = timeout
+        self._connect_kwargs = dict(connect_kwargs, check_same_thread=False)
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._connections = []
+        self._checked_out = {}
+        self._created = time.monotonic()
+        self._stats = dict.fromkeys(
+            ("checkouts", "waits", "timeouts", "in_use", "peak_in_use"), 0)
+        self._wait_time = 0.0
+        self._max_wait = 0.0
+        self._busy_time = 0.0
+        self._closed = False
+
+    def checkout(self, timeout=None):
+        """Take a connection, waiting up to `timeout` seconds for one."""
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats["waits"] += 1
+            if not self._slots.acquire(timeout=timeout):
+                with self._lock:
+                    self._stats["timeouts"] += 1
+                raise PoolTimeout(
+                    f"No connection to {self.db_name} free after {timeout}s")
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            try:
+                conn = sqlite3.connect(self.db_name, **self._connect_kwargs)
+            except BaseException:
+                self._slots.release()
+                raise
+            with self._lock:
+                self._connections.append(conn)
+        now = time.monotonic()
+        with self._lock:
+            waited = now - start
+            self._wait_time += waited
+            self._max_wait = max(self._max_wait, waited)
+            self._checked_out[id(conn)] = now
+            self._stats["checkouts"] += 1
+            self._stats["in_use"] += 1
+            self._stats["peak_in_use"] = max(
+                self._stats["peak_in_use"], self._stats["in_use"])
+        return conn
+
+    def release(self, conn):
+        """Return a connection, rolling back anything left uncommitted."""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            if self._closed:
+                self._discard(conn)
+            else:
+                self._idle.put(conn)
+        except sqlite3.Error:
+            self._discard(conn)
+        finally:
+            with self._lock:
+                self._busy_time += (
+                    time.monotonic() - self._checked_out.pop(id(conn)))
+                self._stats["in_use"] -= 1
+            self._slots.release()
+
+    def _discard(self, conn):
+        with self._lock:
+            self._connections.remove(conn)
+        conn.close()
+
+    def close(self):
+        """Close idle connections; checked-out ones close when returned."""
+        self._closed = True
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+    def stats(self):
+        """Checkout and wait counters plus time-weighted utilization."""
+        now = time.monotonic()
+        with self._lock:
+            stats = dict(self._stats)
+            busy = self._busy_time + sum(
+                now - since for since in self._checked_out.values())
+            stats["open"] = len(self._connections)
+            stats["total_wait"] = self._wait_time
+            stats["max_wait"] = self._max_wait
+        checkouts = stats["checkouts"]
+        stats["avg_wait"] = self._wait_time / checkouts if checkouts else 0.0
+        elapsed = now - self._created
+        stats["utilization"] = busy / (self.size * elapsed) if elapsed else 0.0
+        return stats
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_name, size=4, **kwargs):
+    """Shared pool for `db_name`, created on first use."""
+    with _pools_lock:
+        pool = _pools.get(db_name)
+        if pool is None:
+            pool = _pools[db_name] = ConnectionPool(db_name, size, **kwargs)
+        return pool
+
+
+class PooledDatabaseConnection:
+    """DatabaseConnection that borrows from a ConnectionPool.
+
+    Entering checks a connection out and exiting returns it. Anything not
+    committed is rolled back on the way back, just as closing a plain
+    connection would discard it, so an exception inside the block never
+    leaks a half-done transaction to the next user.
+
+    Blocks nested in the same thread share the outermost block's
+    connection instead of taking a second one (which could deadlock a
+    small pool); only the outermost exit rolls back and returns it.
+    """
+
+    _local = threading.local()
+
+    def __init__(self, db_name, pool=None, timeout=None):
+        self.db_name = db_name
+        self.pool = pool or get_pool(db_name)
+        self.timeout = timeout
+        self.conn = None
+
+    def _held(self):
+        held = getattr(self._local, "held", None)
+        if held is None:
+            held = self._local.held = {}
+        return held
+
+    def __enter__(self):
+        held = self._held()
+        entry = held.get(id(self.pool))
+        if entry is None:
+            entry = held[id(self.pool)] = [
+                self.pool.checkout(self.timeout), 0]
+        entry[1] += 1
+        self.conn = entry[0]
+        return self.conn
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        held = self._held()
+        entry = held[id(self.pool)]
+        entry[1] -= 1
+        self.conn = None
+        if entry[1] == 0:
+            del held[id(self.pool)]
+            self.pool.release(entry[0])
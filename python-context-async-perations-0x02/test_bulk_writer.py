@@ -0,0 +1,45 @@
+import asyncio
+import contextlib
+import unittest
+
+from bulk_writer import AsyncBulkWriter
+
+
+class StalledPool:
+    """Pool whose writer never frees up, so every flush waits on it."""
+
+    def __init__(self):
+        self.checkouts = 0
+
+    def for_query(self, query):
+        return self
+
+    @contextlib.asynccontextmanager
+    async def connection(self):
+        self.checkouts += 1
+        await asyncio.Event().wait()
+        yield
+
+
+class AsyncBulkWriterTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_error_in_body_with_full_buffer_does_not_hang(self):
+        pool = StalledPool()
+        writer = AsyncBulkWriter(pool, batch_size=1, max_buffer=5)
+
+        async def body():
+            async with writer:
+                for i in range(6):
+                    await writer.put((f"user{i}", i))
+                # First row is stuck in a flush, the next five fill the buffer
+                self.assertTrue(writer._queue.full())
+                raise RuntimeError("ingest failed")
+
+        with self.assertRaises(RuntimeError):
+            await asyncio.wait_for(body(), timeout=5)
+        self.assertEqual(pool.checkouts, 1)
+        self.assertIsNone(writer._task)
+
+
+if __name__ == "__main__":
+    unittest.main()
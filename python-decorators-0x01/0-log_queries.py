@@ -1,16 +1,6 @@
 import sqlite3
-import functools
-from datetime import datetime  # ✅ Required for logging timestamp
 
-
-def log_queries(func):
-    """Decorator to log SQL queries with a timestamp."""
-    @functools.wraps(func)
-    def wrapper(*args, **kwargs):
-        query = kwargs.get('query') or (args[0] if args else '')
-        print(f"{datetime.now()} - Executing SQL Query: {query}")
-        return func(*args, **kwargs)
-    return wrapper
+from query_log import log_queries  # ✅ Structured, queue-backed query timing
 
 
 @log_queries
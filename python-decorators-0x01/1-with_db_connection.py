@@ -1,16 +1,4 @@
-import sqlite3
-import functools
-
-def with_db_connection(func):
-    """Decorator to handle opening and closing DB connection."""
-    @functools.wraps(func)
-    def wrapper(*args, **kwargs):
-        conn = sqlite3.connect('users.db')  # opens connection
-        try:
-            return func(conn, *args, **kwargs)  # passes connection to function
-        finally:
-            conn.close()  # closes connection after function is done
-    return wrapper
+from db_pool import with_db_connection  # pooled, PRAGMA-tuned connections
 
 
 @with_db_connection
@@ -1,28 +1,56 @@
-import sqlite3
+import asyncio
 import functools
+import inspect
+
+from db_pool import with_db_connection
+from result_cache import (
+    async_database_path, database_path, invalidate_tables, written_tables)
 
-def with_db_connection(func):
-    """Decorator to handle opening and closing DB connection."""
-    @functools.wraps(func)
-    def wrapper(*args, **kwargs):
-        conn = sqlite3.connect('users.db')
-        try:
-            return func(conn, *args, **kwargs)
-        finally:
-            conn.close()
-    return wrapper
 
 def transactional(func):
-    """Decorator to handle DB transactions (commit/rollback)."""
+    """Decorator to handle DB transactions (commit/rollback).
+
+    Statements run inside the transaction are traced, and once it commits
+    any cached query results that read a modified table are invalidated.
+    Works on async def functions taking an aiosqlite connection too.
+    """
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(conn, *args, **kwargs):
+            # Resolved up front: nothing may raise once the commit is done.
+            database = await async_database_path(conn)
+            touched = set()
+            await conn.set_trace_callback(
+                lambda sql: touched.update(written_tables(sql)))
+            try:
+                result = await func(conn, *args, **kwargs)
+                await conn.commit()
+            except Exception as e:
+                await conn.rollback()
+                raise e
+            finally:
+                await conn.set_trace_callback(None)
+            if touched:
+                # A SharedQueryCache invalidates with blocking SQLite I/O.
+                await asyncio.to_thread(invalidate_tables, touched, database)
+            return result
+        return async_wrapper
+
     @functools.wraps(func)
     def wrapper(conn, *args, **kwargs):
+        database = database_path(conn)
+        touched = set()
+        conn.set_trace_callback(lambda sql: touched.update(written_tables(sql)))
         try:
             result = func(conn, *args, **kwargs)
             conn.commit()
-            return result
         except Exception as e:
             conn.rollback()
             raise e
+        finally:
+            conn.set_trace_callback(None)
+        invalidate_tables(touched, database)
+        return result
     return wrapper
 
 @with_db_connection
@@ -1,35 +1,9 @@
-import time
-import sqlite3
-import functools
+# ✅ Step 1: pooled with_db_connection decorator from previous task
+from db_pool import with_db_connection
 
-# ✅ Step 1: with_db_connection decorator from previous task
-def with_db_connection(func):
-    @functools.wraps(func)
-    def wrapper(*args, **kwargs):
-        conn = sqlite3.connect("users.db")
-        try:
-            return func(conn, *args, **kwargs)
-        finally:
-            conn.close()
-    return wrapper
-
-# ✅ Step 2: retry_on_failure decorator
-def retry_on_failure(retries=3, delay=2):
-    def decorator(func):
-        @functools.wraps(func)
-        def wrapper(*args, **kwargs):
-            last_exception = None
-            for attempt in range(1, retries + 1):
-                try:
-                    return func(*args, **kwargs)
-                except Exception as e:
-                    print(f"Attempt {attempt} failed: {e}")
-                    last_exception = e
-                    if attempt < retries:
-                        time.sleep(delay)
-            raise last_exception
-        return wrapper
-    return decorator
+# ✅ Step 2: retry_on_failure decorator (exponential backoff with jitter,
+# retryable-error classifier and a shared retry budget)
+from retry import retry_on_failure
 
 # ✅ Step 3: Wrap function with both decorators
 @with_db_connection
@@ -1,34 +1,105 @@
+import asyncio
+import os
 import time
-import sqlite3 
 import functools
+import inspect
 
-# ✅ Global dictionary to store cached results
-query_cache = {}
+from db_pool import get_async_pool, get_pool, with_db_connection
+from result_cache import (
+    MISSING, AsyncSingleFlight, QueryCache, SharedQueryCache, SingleFlight,
+    async_database_path, cache_key, database_path, find_query, tables_in)
+
+# ✅ Bounded LRU cache; entries expire after `ttl` seconds and are dropped
+# when a transactional write touches a table they read. Set stale_ttl to
+# keep serving an expired result for that long while it is refreshed in
+# the background. Point QUERY_CACHE_PATH at a file to share cached results
+# (and their invalidation) between every process using it instead.
+if os.environ.get("QUERY_CACHE_PATH"):
+    query_cache = SharedQueryCache(
+        os.environ["QUERY_CACHE_PATH"], max_bytes=64 * 1024 * 1024,
+        ttl=300, stale_ttl=0)
+else:
+    query_cache = QueryCache(maxsize=256, ttl=300, stale_ttl=0)
+
+# ✅ Concurrent misses on the same key share a single execution
+flights = SingleFlight()
+async_flights = AsyncSingleFlight()
+
+
+async def _in_cache(method, *args, **kwargs):
+    """Call a query_cache method from a coroutine.
+
+    SharedQueryCache does blocking SQLite I/O (and may wait out another
+    process's write lock), so it runs on a worker thread instead of the
+    event loop.
+    """
+    if isinstance(query_cache, SharedQueryCache):
+        return await asyncio.to_thread(method, *args, **kwargs)
+    return method(*args, **kwargs)
 
-# ✅ with_db_connection decorator
-def with_db_connection(func):
-    @functools.wraps(func)
-    def wrapper(*args, **kwargs):
-        conn = sqlite3.connect("users.db")
-        try:
-            return func(conn, *args, **kwargs)
-        finally:
-            conn.close()
-    return wrapper
 
 # ✅ cache_query decorator
 def cache_query(func):
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(conn, *args, **kwargs):
+            query = find_query(args, kwargs)
+            tables = tables_in(query)
+            database = await async_database_path(conn)
+            key = cache_key(func, database, args, kwargs)
+
+            async def load(conn=conn):
+                print("Executing and caching query:", query)
+                # A write committed while func runs bumps the generation,
+                # and set() then drops the result it may predate.
+                since = await _in_cache(query_cache.generation, tables)
+                result = await func(conn, *args, **kwargs)
+                await _in_cache(query_cache.set, key, result, tables,
+                                generation=since)
+                return result
+
+            result, stale = await _in_cache(query_cache.lookup, key)
+            if result is not MISSING:
+                if stale:
+                    # The caller's connection goes back to the pool when
+                    # we return, so the refresh checks out its own.
+                    pool = get_async_pool(database)
+
+                    async def refresh():
+                        async with pool.connection() as fresh:
+                            return await load(fresh)
+                    async_flights.refresh(key, refresh)
+                print("Using cached result for query:", query)
+                return result
+            return await async_flights.do(key, load)
+        return async_wrapper
+
     @functools.wraps(func)
     def wrapper(conn, *args, **kwargs):
-        query = kwargs.get("query")
-        if query in query_cache:
-            print("Using cached result for query:", query)
-            return query_cache[query]
-        else:
+        query = find_query(args, kwargs)
+        tables = tables_in(query)
+        key = cache_key(func, database_path(conn), args, kwargs)
+
+        def load(conn=conn):
             print("Executing and caching query:", query)
+            since = query_cache.generation(tables)
             result = func(conn, *args, **kwargs)
-            query_cache[query] = result
+            query_cache.set(key, result, tables, generation=since)
             return result
+
+        result, stale = query_cache.lookup(key)
+        if result is not MISSING:
+            if stale:
+                pool = get_pool(database_path(conn))
+
+                def refresh():
+                    with pool.connection() as fresh:
+                        return load(fresh)
+                flights.refresh(key, refresh)
+            print("Using cached result for query:", query)
+            return result
+        else:
+            return flights.do(key, load)
     return wrapper
 
 # ✅ Decorated function to fetch users
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""Calls/sec of a decorated point lookup, per-call connect vs pooled.
+
+Pooled connections also keep their prepared statements between calls;
+the pool's statement cache hit rate is printed at the end.
+
+Usage: ./bench_db_connection.py [calls]
+
+Runs against a scratch copy of the users schema in a temporary directory,
+so users.db is left untouched.
+"""
+import functools
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+from db_pool import get_pool, with_db_connection
+
+
+def connect_per_call(database):
+    """The original decorator: a fresh connection for every call."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            conn = sqlite3.connect(database)
+            try:
+                return func(conn, *args, **kwargs)
+            finally:
+                conn.close()
+        return wrapper
+    return decorator
+
+
+def get_user_by_id(conn, user_id):
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,))
+    return cursor.fetchone()
+
+
+def calls_per_sec(func, calls):
+    start = time.perf_counter()
+    for i in range(calls):
+        func(user_id=i % 1000 + 1)
+    return calls / (time.perf_counter() - start)
+
+
+def main(calls):
+    with tempfile.TemporaryDirectory() as tmp:
+        database = os.path.join(tmp, "users.db")
+        with sqlite3.connect(database) as conn:
+            conn.execute("CREATE TABLE users ("
+                         "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                         "name TEXT NOT NULL)")
+            conn.executemany("INSERT INTO users (name) VALUES (?)",
+                             ((f"user{i}",) for i in range(1000)))
+        conn.close()
+
+        for name, decorate in (
+            ("per-call", connect_per_call(database)),
+            ("pooled", with_db_connection(database=database)),
+        ):
+            rate = calls_per_sec(decorate(get_user_by_id), calls)
+            print(f"{name:>9}: {rate:>10.0f} calls/sec")
+        stats = get_pool(database).stats()
+        print(f"statement cache hit rate (pooled): "
+              f"{stats['statement_hit_rate']:.1%}")
+        get_pool(database).close()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Updates/sec with per-call transactions vs group commit.
+
+Usage: ./bench_group_commit.py [updates] [threads]
+
+Uses a scratch WAL-mode database (created next to this script, so it sits
+on a real disk rather than tmpfs) with synchronous=FULL, so every commit
+is durable and fsyncs.
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from db_pool import get_pool, with_db_connection
+from group_commit import GroupCommitter, group_transactional
+
+PRAGMAS = {"journal_mode": "WAL", "synchronous": "FULL"}
+
+
+def update_user_email(conn, user_id, new_email):
+    conn.execute("UPDATE users SET email = ? WHERE id = ?",
+                 (new_email, user_id))
+
+
+def commit_per_call(func):
+    """What @transactional does: one commit per decorated call."""
+    def wrapper(conn, *args, **kwargs):
+        try:
+            result = func(conn, *args, **kwargs)
+            conn.commit()
+            return result
+        except Exception:
+            conn.rollback()
+            raise
+    return wrapper
+
+
+def run(update, updates, threads):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        list(executor.map(
+            lambda i: update(user_id=i % 1000 + 1, new_email=f"u{i}@x.io"),
+            range(updates)))
+    return updates / (time.perf_counter() - start)
+
+
+def main(updates, threads):
+    here = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory(dir=here) as tmp:
+        database = os.path.join(tmp, "users.db")
+        conn = sqlite3.connect(database)
+        conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, "
+                     "name TEXT NOT NULL, email TEXT)")
+        conn.executemany("INSERT INTO users (name) VALUES (?)",
+                         ((f"user{i}",) for i in range(1000)))
+        conn.commit()
+        conn.close()
+        get_pool(database, size=threads, pragmas=PRAGMAS)
+
+        per_call = with_db_connection(database=database)(
+            commit_per_call(update_user_email))
+        committer = GroupCommitter(database)
+        grouped = group_transactional(update_user_email, committer=committer)
+
+        print(f"{updates} updates from {threads} threads, WAL + synchronous=FULL")
+        print(f"   per-call: {run(per_call, updates, threads):>10.0f} updates/sec")
+        rate = run(grouped, updates, threads)
+        committer.close()
+        print(f"    grouped: {rate:>10.0f} updates/sec "
+              f"({committer.writes / max(committer.batches, 1):.1f} per commit)")
+        get_pool(database).close()
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:3]]
+    main(*(args + [5000, 8][len(args):]))
@@ -0,0 +1,356 @@
+"""Pooled SQLite connections behind the with_db_connection decorator.
+
+Opening a sqlite3 connection means opening the file and loading the schema
+on first use, and the old decorator paid that cost on every call. Here
+connections are created lazily, tuned once with PRAGMAs (WAL journal,
+relaxed fsync, larger page cache, memory-mapped I/O) and then reused.
+Pools are bounded, shared per database file, and safe to use from several
+threads.
+
+Coroutine functions decorated with with_db_connection get an aiosqlite
+connection from an AsyncConnectionPool. There is one such pool per event
+loop and database file.
+"""
+import asyncio
+import contextlib
+import functools
+import inspect
+import queue
+import sqlite3
+import threading
+import weakref
+from collections import OrderedDict
+
+from result_cache import canonical_database
+
+try:
+    import aiosqlite
+except ImportError:  # only needed for async def targets
+    aiosqlite = None
+
+# sqlite3's own default is 128 prepared statements per connection.
+DEFAULT_CACHED_STATEMENTS = 256
+
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -16000,      # negative means KiB, so ~16 MiB
+    "mmap_size": 268435456,    # 256 MiB
+}
+
+
+class PoolTimeout(sqlite3.OperationalError):
+    """No pooled connection became free within the checkout timeout."""
+
+
+class StatementCountingCursor(sqlite3.Cursor):
+    """Cursor that reports each SQL text it runs to its connection."""
+
+    def execute(self, sql, parameters=()):
+        self.connection.note_statement(sql)
+        return super().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        self.connection.note_statement(sql)
+        return super().executemany(sql, seq_of_parameters)
+
+
+class PooledConnection(sqlite3.Connection):
+    """sqlite3 connection that remembers the database path it was opened on."""
+
+    path = ""
+
+
+class StatementTrackingConnection(PooledConnection):
+    """Pooled connection that also measures prepared-statement reuse.
+
+    sqlite3 keeps the last `cached_statements` prepared statements per
+    connection, keyed by SQL text, and does not report whether a given
+    execute reused one. note_statement() mirrors that LRU so hit rates
+    can be reported per connection.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.statement_capacity = kwargs.get(
+            "cached_statements", DEFAULT_CACHED_STATEMENTS)
+        self.statement_hits = 0
+        self.statement_misses = 0
+        self._statements = OrderedDict()
+
+    def cursor(self, factory=None):
+        return super().cursor(factory or StatementCountingCursor)
+
+    # Connection.execute() gets its cursor from cursor() but then runs the
+    # C-level Cursor.execute, bypassing StatementCountingCursor, so the
+    # shortcuts record the statement themselves.
+    def execute(self, sql, parameters=()):
+        self.note_statement(sql)
+        return super().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        self.note_statement(sql)
+        return super().executemany(sql, seq_of_parameters)
+
+    def note_statement(self, sql):
+        statements = self._statements
+        if sql in statements:
+            statements.move_to_end(sql)
+            self.statement_hits += 1
+            return
+        self.statement_misses += 1
+        statements[sql] = None
+        if len(statements) > self.statement_capacity:
+            statements.popitem(last=False)
+
+
+class ConnectionPool:
+    """Bounded LIFO pool of sqlite3 connections for one database file.
+
+    LIFO order means a single-threaded caller keeps getting the same warm
+    connection back. Each connection keeps up to `cached_statements`
+    prepared statements. With track_statements, stats() reports how often
+    they are reused, at the cost of a Python-level cursor per execute.
+    Connections are opened with check_same_thread=False so they can move
+    between threads. Each one is still used by only one thread at a time,
+    the one that checked it out.
+    """
+
+    def __init__(self, database="users.db", size=4, timeout=30.0,
+                 pragmas=None, cached_statements=DEFAULT_CACHED_STATEMENTS,
+                 track_statements=True, **connect_kwargs):
+        self.database = database
+        self.size = size
+        self.timeout = timeout
+        self.pragmas = DEFAULT_PRAGMAS if pragmas is None else pragmas
+        self._connect_kwargs = dict(
+            connect_kwargs, cached_statements=cached_statements)
+        self._factory = (StatementTrackingConnection if track_statements
+                         else PooledConnection)
+        self._connections = []
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._stats = dict.fromkeys(
+            ("created", "checkouts", "waits", "timeouts", "in_use"), 0)
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def _connect(self):
+        kwargs = {"factory": self._factory, "check_same_thread": False}
+        kwargs.update(self._connect_kwargs)
+        conn = sqlite3.connect(self.database, **kwargs)
+        conn.path = self.database
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        with self._lock:
+            self._stats["created"] += 1
+            self._connections.append(conn)
+        return conn
+
+    def checkout(self, timeout=None):
+        """Take a connection, waiting up to `timeout` seconds for one."""
+        timeout = self.timeout if timeout is None else timeout
+        if not self._slots.acquire(blocking=False):
+            self._count("waits")
+            if not self._slots.acquire(timeout=timeout):
+                self._count("timeouts")
+                raise PoolTimeout(
+                    f"No connection to {self.database} free after {timeout}s")
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            try:
+                conn = self._connect()
+            except BaseException:
+                self._slots.release()
+                raise
+        with self._lock:
+            self._stats["checkouts"] += 1
+            self._stats["in_use"] += 1
+        return conn
+
+    def release(self, conn):
+        """Return a connection, rolling back anything left uncommitted."""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+        except sqlite3.Error:
+            self._discard(conn)
+        finally:
+            self._count("in_use", -1)
+            self._slots.release()
+
+    def _discard(self, conn):
+        with self._lock:
+            self._connections.remove(conn)
+        conn.close()
+
+    @contextlib.contextmanager
+    def connection(self, timeout=None):
+        conn = self.checkout(timeout)
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        """Close every idle connection."""
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+    def stats(self):
+        """Checkout counters plus prepared-statement cache hit rate."""
+        with self._lock:
+            stats = dict(self._stats)
+            connections = list(self._connections)
+        stats["idle"] = self._idle.qsize()
+        hits = sum(getattr(c, "statement_hits", 0) for c in connections)
+        misses = sum(getattr(c, "statement_misses", 0) for c in connections)
+        stats["statement_hits"] = hits
+        stats["statement_misses"] = misses
+        stats["statement_hit_rate"] = (
+            hits / (hits + misses) if hits + misses else 0.0)
+        return stats
+
+
+class AsyncConnectionPool:
+    """Bounded LIFO pool of aiosqlite connections, for one event loop."""
+
+    def __init__(self, database="users.db", size=4, timeout=30.0,
+                 pragmas=None, cached_statements=DEFAULT_CACHED_STATEMENTS):
+        if aiosqlite is None:
+            raise ImportError("async DB functions require aiosqlite")
+        self.database = database
+        self.size = size
+        self.timeout = timeout
+        self.pragmas = DEFAULT_PRAGMAS if pragmas is None else pragmas
+        self.cached_statements = cached_statements
+        self._idle = []
+        self._slots = asyncio.Semaphore(size)
+        self._stats = dict.fromkeys(
+            ("created", "checkouts", "timeouts", "in_use"), 0)
+
+    async def _connect(self):
+        conn = await aiosqlite.connect(
+            self.database, cached_statements=self.cached_statements)
+        conn.path = self.database
+        for name, value in self.pragmas.items():
+            await conn.execute(f"PRAGMA {name} = {value}")
+        self._stats["created"] += 1
+        return conn
+
+    async def checkout(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout)
+        except asyncio.TimeoutError:
+            self._stats["timeouts"] += 1
+            raise PoolTimeout(
+                f"No connection to {self.database} free after {timeout}s"
+            ) from None
+        try:
+            conn = self._idle.pop() if self._idle else await self._connect()
+        except BaseException:
+            self._slots.release()
+            raise
+        self._stats["checkouts"] += 1
+        self._stats["in_use"] += 1
+        return conn
+
+    async def release(self, conn):
+        try:
+            if conn.in_transaction:
+                await conn.rollback()
+            self._idle.append(conn)
+        except sqlite3.Error:
+            await conn.close()
+        finally:
+            self._stats["in_use"] -= 1
+            self._slots.release()
+
+    @contextlib.asynccontextmanager
+    async def connection(self, timeout=None):
+        conn = await self.checkout(timeout)
+        try:
+            yield conn
+        finally:
+            await self.release(conn)
+
+    async def close(self):
+        while self._idle:
+            await self._idle.pop().close()
+
+    def stats(self):
+        return dict(self._stats, idle=len(self._idle))
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+_async_pools = weakref.WeakKeyDictionary()
+
+
+def get_pool(database="users.db", **kwargs):
+    """Return the process-wide pool for `database`, creating it if needed.
+
+    Keyword arguments only take effect when the pool is first created.
+    Different spellings of the same file share one pool.
+    """
+    database = canonical_database(database)
+    with _pools_lock:
+        pool = _pools.get(database)
+        if pool is None:
+            pool = _pools[database] = ConnectionPool(database, **kwargs)
+        return pool
+
+
+def get_async_pool(database="users.db", **kwargs):
+    """Return the running event loop's async pool for `database`."""
+    database = canonical_database(database)
+    pools = _async_pools.setdefault(asyncio.get_running_loop(), {})
+    pool = pools.get(database)
+    if pool is None:
+        pool = pools[database] = AsyncConnectionPool(database, **kwargs)
+    return pool
+
+
+async def close_async_pools():
+    """Close the running event loop's idle async connections.
+
+    Await it before the loop finishes: each aiosqlite connection has a
+    worker thread that keeps the interpreter from exiting until closed.
+    """
+    pools = _async_pools.pop(asyncio.get_running_loop(), {})
+    for pool in pools.values():
+        await pool.close()
+
+
+def with_db_connection(func=None, *, database="users.db"):
+    """Decorator that passes a pooled connection as the first argument.
+
+    Works bare (@with_db_connection) or with a database path
+    (@with_db_connection(database="other.db")). An async def function
+    gets an aiosqlite connection instead of a sqlite3 one; see
+    close_async_pools().
+    """
+    if func is None:
+        return functools.partial(with_db_connection, database=database)
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            async with get_async_pool(database).connection() as conn:
+                return await func(conn, *args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with get_pool(database).connection() as conn:
+            return func(conn, *args, **kwargs)
+    return wrapper
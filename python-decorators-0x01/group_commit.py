@@ -0,0 +1,207 @@
+"""Group commit: coalesce many small write transactions into one.
+
+With plain @transactional, every decorated call commits on its own, and
+with synchronous=FULL each commit is an fsync. A GroupCommitter runs the
+writes on one writer thread and commits them in batches. A batch closes
+when it holds max_batch writes or when max_delay seconds have passed since
+its first write. With the default max_delay of 0, a batch is simply
+everything that queued up while the previous commit was running.
+
+Each write runs inside its own SAVEPOINT, so a write that raises is
+rolled back alone and its exception goes only to its caller. The others
+still commit together.
+
+    @group_transactional(database="users.db")
+    def update_user_email(conn, user_id, new_email):
+        conn.execute("UPDATE users SET email = ? WHERE id = ?",
+                     (new_email, user_id))
+
+    update_user_email(user_id=1, new_email="a@b.c")  # waits for the commit
+    futures = [update_user_email.submit(user_id=i, new_email=e) for ...]
+"""
+import atexit
+import functools
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+from db_pool import get_pool
+from result_cache import (
+    canonical_database, invalidate_tables, written_tables)
+
+_STOP = object()
+
+
+class GroupCommitter:
+    """Writer thread that commits queued write functions in batches."""
+
+    def __init__(self, database="users.db", max_batch=256, max_delay=0.0):
+        self.database = canonical_database(database)
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._jobs = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.writes = 0
+
+    def submit(self, func, *args, **kwargs):
+        """Queue func(conn, *args, **kwargs); returns a Future of its result."""
+        future = Future()
+        with self._lock:
+            if self._thread is None:
+                # Each writer thread gets its own queue, so a _STOP meant
+                # for one that is shutting down never reaches its successor.
+                self._jobs = queue.SimpleQueue()
+                self._thread = threading.Thread(
+                    target=self._run, args=(self._jobs,),
+                    name=f"group-commit:{self.database}", daemon=True)
+                self._thread.start()
+            self._jobs.put((future, func, args, kwargs))
+        return future
+
+    def close(self):
+        """Commit everything queued so far and stop the writer thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is not None:
+                self._jobs.put(_STOP)
+        if thread is not None:
+            thread.join()
+
+    def _next_batch(self, first, jobs):
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            try:
+                job = (jobs.get(timeout=timeout) if timeout > 0
+                       else jobs.get_nowait())
+            except queue.Empty:
+                break
+            if job is _STOP:
+                jobs.put(_STOP)
+                break
+            batch.append(job)
+        return batch
+
+    def _run(self, jobs):
+        try:
+            pool = get_pool(self.database)
+            conn = pool.checkout()
+        except Exception as e:
+            self._abandon(jobs, e)
+            return
+        touched = set()
+        conn.set_trace_callback(lambda sql: touched.update(written_tables(sql)))
+        batch = []
+        try:
+            while True:
+                job = jobs.get()
+                if job is _STOP:
+                    return
+                touched.clear()
+                batch = self._next_batch(job, jobs)
+                self._commit(conn, batch)
+                invalidate_tables(touched, self.database)
+        except Exception as e:
+            for future, *_ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            self._abandon(jobs, e)
+        finally:
+            conn.set_trace_callback(None)
+            pool.release(conn)
+
+    def _abandon(self, jobs, error):
+        """Writer is dying: fail what it still holds, let submit() restart."""
+        with self._lock:
+            if self._jobs is jobs:
+                self._thread = None
+            while True:
+                try:
+                    job = jobs.get_nowait()
+                except queue.Empty:
+                    break
+                if job is not _STOP and job[0].set_running_or_notify_cancel():
+                    job[0].set_exception(error)
+
+    def _commit(self, conn, batch):
+        done = []
+        try:
+            conn.execute("BEGIN")
+            for future, func, args, kwargs in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                conn.execute("SAVEPOINT group_write")
+                try:
+                    result = func(conn, *args, **kwargs)
+                except Exception as e:
+                    conn.execute("ROLLBACK TO group_write")
+                    conn.execute("RELEASE group_write")
+                    future.set_exception(e)
+                    continue
+                conn.execute("RELEASE group_write")
+                done.append((future, result))
+            conn.commit()
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.rollback()
+            for future, _ in done:
+                future.set_exception(e)
+            for future, *_ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.batches += 1
+        self.writes += len(done)
+        for future, result in done:
+            future.set_result(result)
+
+
+_committers = {}
+_committers_lock = threading.Lock()
+
+
+def get_committer(database="users.db", **kwargs):
+    """Process-wide GroupCommitter for `database`."""
+    database = canonical_database(database)
+    with _committers_lock:
+        committer = _committers.get(database)
+        if committer is None:
+            committer = _committers[database] = GroupCommitter(
+                database, **kwargs)
+        return committer
+
+
+@atexit.register
+def _close_committers():
+    with _committers_lock:
+        committers = list(_committers.values())
+    for committer in committers:
+        committer.close()
+
+
+def group_transactional(func=None, *, database="users.db", committer=None):
+    """Decorator that runs a write through group commit.
+
+    Replaces @with_db_connection @transactional for write functions: the
+    function receives the writer's connection, and the call returns (or
+    raises) once its batch has committed. wrapper.submit(...) queues the
+    write and returns a Future instead of blocking.
+    """
+    if func is None:
+        return functools.partial(
+            group_transactional, database=database, committer=committer)
+
+    def submit(*args, **kwargs):
+        target = committer or get_committer(database)
+        return target.submit(func, *args, **kwargs)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return submit(*args, **kwargs).result()
+    wrapper.submit = submit
+    return wrapper
@@ -0,0 +1,372 @@
+"""Structured, low-overhead query timing for decorated DB functions.
+
+log_queries records, for every call, the query fingerprint, number of
+bound parameters, wall time, rows returned and calling location. Records
+go to the "queries" logger through a QueueHandler. A background
+QueueListener formats and writes them as JSON lines, so the caller never
+blocks on stdout. sample_rate controls what fraction of calls is logged.
+Every call, sampled or not, is added to per-fingerprint latency
+histograms, which latency_report() summarizes as p50/p95/p99.
+
+Calls slower than a threshold are always logged at WARNING, whatever the
+sample rate. The first time a fingerprint is slow its plan is captured
+(EXPLAIN QUERY PLAN on SQLite, EXPLAIN otherwise), and slow_queries keeps
+the N slowest distinct fingerprints along with their plans.
+"""
+import atexit
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import math
+import random
+import re
+import sqlite3
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+
+logger = logging.getLogger("queries")
+
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_RE = re.compile(r"\?|(?<!:):\w+")
+_SPACE_RE = re.compile(r"\s+")
+
+# Latency buckets are 2**(1/8) apart (~9% wide), starting at 1 microsecond.
+_BUCKETS_PER_DOUBLING = 8
+
+
+def fingerprint(sql):
+    """Return (normalized_sql, short_hash), with literals replaced by '?'."""
+    normalized = _SPACE_RE.sub(" ", _LITERAL_RE.sub("?", sql)).strip()
+    digest = hashlib.sha1(normalized.lower().encode()).hexdigest()[:12]
+    return normalized, digest
+
+
+def _param_count(sql):
+    return len(_PLACEHOLDER_RE.findall(_LITERAL_RE.sub("", sql)))
+
+
+def _find_query(args, kwargs):
+    query = kwargs.get("query")
+    if query is None:
+        query = next((arg for arg in args if isinstance(arg, str)), "")
+    return query
+
+
+def _find_connection(args, kwargs):
+    conn = kwargs.get("conn")
+    if conn is None:
+        conn = next((arg for arg in args if hasattr(arg, "cursor")), None)
+    return conn
+
+
+def explain(conn, sql):
+    """Return the query plan for `sql` as a list of rows.
+
+    Placeholders are bound to NULL; the plan depends on the statement's
+    shape, not on the values bound into it.
+    """
+    if isinstance(conn, sqlite3.Connection):
+        statement, placeholder = f"EXPLAIN QUERY PLAN {sql}", _PLACEHOLDER_RE
+    else:
+        statement, placeholder = f"EXPLAIN {sql}", re.compile(r"%s")
+    names = placeholder.findall(_LITERAL_RE.sub("", sql))
+    if names and names[0].startswith(":"):
+        params = {name[1:]: None for name in names}
+    else:
+        params = (None,) * len(names)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(statement, params)
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+
+
+_WRAPPERS = ("observe", "wrapper", "async_wrapper")
+
+
+def _caller():
+    """file:line of the code that called the outermost decorator.
+
+    Every decorator in this package names its inner function `wrapper`
+    (or `async_wrapper`), so stacked decorators are skipped by walking
+    past those frames.
+    """
+    frame = sys._getframe(2)
+    while frame.f_back is not None and frame.f_code.co_name in _WRAPPERS:
+        frame = frame.f_back
+    return f"{frame.f_code.co_filename}:{frame.f_lineno}"
+
+
+def _row_count(result):
+    if result is None:
+        return 0
+    if isinstance(result, list):
+        return len(result)
+    return 1
+
+
+class LatencyHistogram:
+    """Log-bucketed latency histogram with bounded memory."""
+
+    def __init__(self):
+        self.count = 0
+        self.max = 0.0
+        self._buckets = {}
+
+    def add(self, seconds):
+        micros = max(seconds * 1e6, 1.0)
+        bucket = int(math.log2(micros) * _BUCKETS_PER_DOUBLING)
+        self._buckets[bucket] = self._buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.max = max(self.max, seconds)
+
+    def percentile(self, p):
+        """Upper bound, in seconds, of the bucket holding the p-th percentile."""
+        if not self.count:
+            return None
+        rank = math.ceil(p / 100 * self.count)
+        seen = 0
+        for bucket in sorted(self._buckets):
+            seen += self._buckets[bucket]
+            if seen >= rank:
+                upper = 2 ** ((bucket + 1) / _BUCKETS_PER_DOUBLING) / 1e6
+                return min(upper, self.max)
+        return self.max
+
+
+class SlowQueryLog:
+    """The `capacity` slowest distinct query fingerprints, with plans.
+
+    threshold_ms is the default slowness threshold for log_queries; None
+    disables slow-query detection unless a decorator sets slow_ms.
+    """
+
+    def __init__(self, threshold_ms=None, capacity=20):
+        self.threshold_ms = threshold_ms
+        self.capacity = capacity
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, digest):
+        with self._lock:
+            return digest in self._entries
+
+    def add(self, digest, normalized, duration_ms, caller, plan=None):
+        """Record a slow call; returns False if it did not make the top N."""
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                if len(self._entries) >= self.capacity:
+                    fastest = min(self._entries.values(),
+                                  key=lambda e: e["max_ms"])
+                    if fastest["max_ms"] >= duration_ms:
+                        return False
+                    del self._entries[fastest["fingerprint"]]
+                entry = self._entries[digest] = {
+                    "fingerprint": digest, "query": normalized,
+                    "count": 0, "max_ms": 0.0, "plan": plan,
+                }
+            entry["count"] += 1
+            if duration_ms >= entry["max_ms"]:
+                entry["max_ms"] = duration_ms
+                entry["caller"] = caller
+            if plan is not None:
+                entry["plan"] = plan
+            return True
+
+    def slowest(self):
+        """Entries ordered from slowest to fastest."""
+        with self._lock:
+            entries = [dict(entry) for entry in self._entries.values()]
+        return sorted(entries, key=lambda e: e["max_ms"], reverse=True)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+slow_queries = SlowQueryLog()
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def _record(digest, normalized, seconds):
+    with _stats_lock:
+        entry = _stats.get(digest)
+        if entry is None:
+            entry = _stats[digest] = (normalized, LatencyHistogram())
+        entry[1].add(seconds)
+
+
+def latency_report():
+    """Per-fingerprint call count and p50/p95/p99/max latency in ms."""
+    with _stats_lock:
+        entries = list(_stats.items())
+    report = {}
+    for digest, (normalized, histogram) in entries:
+        report[digest] = {
+            "query": normalized,
+            "count": histogram.count,
+            "p50_ms": histogram.percentile(50) * 1000,
+            "p95_ms": histogram.percentile(95) * 1000,
+            "p99_ms": histogram.percentile(99) * 1000,
+            "max_ms": histogram.max * 1000,
+        }
+    return report
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats query records as one JSON object per line."""
+
+    FIELDS = ("fingerprint", "query", "params", "duration_ms", "rows",
+              "caller", "slow", "plan", "error")
+
+    def format(self, record):
+        payload = {"ts": record.created}
+        payload.update(
+            (name, getattr(record, name)) for name in self.FIELDS
+            if hasattr(record, name))
+        payload["event"] = record.getMessage()
+        return json.dumps(payload, default=str)
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """QueueHandler that leaves all formatting to the listener thread."""
+
+    def prepare(self, record):
+        return record
+
+
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def configure_logging(handler=None):
+    """Route the "queries" logger through a background queue listener.
+
+    `handler` receives the records on the listener thread; by default a
+    stdout StreamHandler with JsonFormatter. Called automatically on first
+    use; call it yourself to send records elsewhere.
+    """
+    global _listener
+    if handler is None:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(JsonFormatter())
+    with _listener_lock:
+        if _listener is not None:
+            _listener.stop()
+        for old in list(logger.handlers):
+            logger.removeHandler(old)
+        log_queue = SimpleQueue()
+        logger.addHandler(_DeferredQueueHandler(log_queue))
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        _listener = QueueListener(log_queue, handler)
+        _listener.start()
+
+
+def _ensure_logging():
+    if _listener is None:
+        configure_logging()
+
+
+@atexit.register
+def _flush_logging():
+    with _listener_lock:
+        if _listener is not None:
+            _listener.stop()
+
+
+def log_queries(func=None, *, sample_rate=1.0, slow_ms=None):
+    """Decorator that times a query function and logs a structured record.
+
+    The SQL is read from the `query` keyword or the first string argument.
+    Calls slower than slow_ms (default: slow_queries.threshold_ms) are
+    flagged. For EXPLAIN capture the decorated function must receive its
+    connection as an argument, e.g. when stacked under with_db_connection;
+    plans are not captured for async def functions. Use bare
+    (@log_queries) or configured (@log_queries(sample_rate=0.1, slow_ms=50)).
+    """
+    if func is None:
+        return functools.partial(
+            log_queries, sample_rate=sample_rate, slow_ms=slow_ms)
+
+    def observe(query, elapsed, result, conn, error):
+        normalized, digest = fingerprint(query)
+        _record(digest, normalized, elapsed)
+        duration_ms = elapsed * 1000
+        threshold = slow_queries.threshold_ms if slow_ms is None else slow_ms
+        slow = threshold is not None and duration_ms > threshold
+        if (error is None and not slow and sample_rate < 1.0
+                and random.random() >= sample_rate):
+            return
+
+        caller = _caller()
+        record = {
+            "fingerprint": digest,
+            "query": normalized,
+            "params": _param_count(query),
+            "duration_ms": round(duration_ms, 3),
+            "rows": _row_count(result),
+            "caller": caller,
+            "error": (None if error is None
+                      else f"{type(error).__name__}: {error}"),
+        }
+        if slow:
+            plan = None
+            if conn is not None and digest not in slow_queries:
+                try:
+                    plan = explain(conn, query)
+                except Exception as e:
+                    plan = f"EXPLAIN failed: {e}"
+            slow_queries.add(digest, normalized, duration_ms, caller, plan)
+            record.update(slow=True, plan=plan)
+        if error is not None:
+            level = logging.ERROR
+        else:
+            level = logging.WARNING if slow else logging.INFO
+        _ensure_logging()
+        logger.log(level, "query", extra=record)
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            result = error = None
+            try:
+                result = await func(*args, **kwargs)
+                return result
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                observe(_find_query(args, kwargs),
+                        time.perf_counter() - start, result, None, error)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        result = error = None
+        try:
+            result = func(*args, **kwargs)
+            return result
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            observe(_find_query(args, kwargs), time.perf_counter() - start,
+                    result, _find_connection(args, kwargs), error)
+    return wrapper
@@ -0,0 +1,561 @@
+"""Bounded, expiring query result cache shared by the DB decorators.
+
+QueryCache is an LRU map with a per-entry TTL. Each entry records the
+tables its query read. When transactional commits a write, it calls
+invalidate_tables() with the tables it touched, and every matching entry
+in every live QueryCache for that database is dropped. Each invalidation
+also bumps the tables' generation: a loader notes generation() before it
+queries and passes it to set(), which discards a result read before a
+write that committed in the meantime.
+
+SingleFlight (threads) and AsyncSingleFlight (coroutines) let concurrent
+callers that miss on the same key share one execution instead of each
+querying the database.
+
+SharedQueryCache is a drop-in alternative kept in a SQLite file, so
+several worker processes share results and invalidations.
+"""
+import asyncio
+import hashlib
+import os
+import pickle
+import re
+import sqlite3
+import threading
+import time
+import weakref
+import zlib
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+MISSING = object()
+
+_TABLE_RE = re.compile(r"\b(?:FROM|JOIN|INTO|UPDATE)\s+[`\"\[]?(\w+)", re.I)
+_WRITE_RE = re.compile(r"^\s*(?:INSERT|REPLACE|UPDATE|DELETE)\b", re.I)
+
+_caches = weakref.WeakSet()
+
+
+def tables_in(sql):
+    """Lower-cased names of the tables a SQL statement mentions."""
+    return frozenset(name.lower() for name in _TABLE_RE.findall(sql))
+
+
+def written_tables(sql):
+    """Tables a statement may modify; empty for anything but a write."""
+    return tables_in(sql) if _WRITE_RE.match(sql) else frozenset()
+
+
+def canonical_database(database):
+    """Absolute, symlink-free path, so every spelling of a file matches.
+
+    In-memory databases ('' or ':memory:') and file: URIs are returned
+    unchanged.
+    """
+    if not database or database == ":memory:" or database.startswith("file:"):
+        return database
+    return os.path.realpath(database)
+
+
+def database_path(conn):
+    """Canonical path of a sqlite3 connection's main database.
+
+    Pooled connections carry their path; other sqlite3 connections are
+    asked via PRAGMA. See async_database_path() for aiosqlite.
+    """
+    path = getattr(conn, "path", None)
+    if path is None:
+        if not isinstance(conn, sqlite3.Connection):
+            raise TypeError(f"Cannot tell which database {conn!r} is using")
+        path = conn.execute("PRAGMA database_list").fetchone()[2]
+    return canonical_database(path)
+
+
+async def async_database_path(conn):
+    """database_path() for an aiosqlite connection, pooled or not."""
+    path = getattr(conn, "path", None)
+    if path is None:
+        async with conn.execute("PRAGMA database_list") as cursor:
+            path = (await cursor.fetchone())[2]
+    return canonical_database(path)
+
+
+def _freeze(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
+def find_query(args, kwargs):
+    """The SQL a decorated call runs: `query=`, else its first str argument."""
+    query = kwargs.get("query")
+    if query is None:
+        query = next((arg for arg in args if isinstance(arg, str)), "")
+    return query
+
+
+def cache_key(func, database, args, kwargs):
+    """Key covering the database file, the function and its arguments.
+
+    `database` comes first: invalidate() matches entries on key[0].
+    """
+    return (database, func.__module__, func.__qualname__,
+            _freeze(args), _freeze(kwargs))
+
+
+def invalidate_tables(tables, database=None):
+    """Drop entries that read any of `tables` from every live cache."""
+    tables = frozenset(t.lower() for t in tables)
+    if not tables:
+        return 0
+    return sum(cache.invalidate(tables, database) for cache in list(_caches))
+
+
+class QueryCache:
+    """Thread-safe LRU cache of query results with a per-entry TTL.
+
+    stale_ttl > 0 enables stale-while-revalidate; see lookup().
+    """
+
+    def __init__(self, maxsize=256, ttl=300.0, stale_ttl=0.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+        self._stats = dict.fromkeys(
+            ("hits", "stale_hits", "misses", "evictions", "expirations",
+             "invalidations", "stale_sets"), 0)
+        _caches.add(self)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def lookup(self, key):
+        """Return (value, stale) for `key`; value is MISSING on a miss.
+
+        Past its TTL an entry is still returned, flagged stale, for
+        another stale_ttl seconds so callers can serve it while they
+        refresh it.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return MISSING, False
+            expires, _, value = entry
+            now = time.monotonic()
+            stale = expires is not None and expires <= now
+            if stale and expires + self.stale_ttl <= now:
+                del self._entries[key]
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return MISSING, False
+            self._entries.move_to_end(key)
+            self._stats["stale_hits" if stale else "hits"] += 1
+            return value, stale
+
+    def get(self, key):
+        """Return the fresh cached value for `key`, or MISSING."""
+        value, stale = self.lookup(key)
+        return MISSING if stale else value
+
+    def generation(self, tables):
+        """Token that changes whenever any of `tables` is invalidated."""
+        with self._lock:
+            return sum(self._generations.get(t, 0) for t in tables)
+
+    def set(self, key, value, tables=(), ttl=None, generation=None):
+        """Store `value`, remembering which tables it was read from.
+
+        Pass the generation() noted before the query ran: if one of its
+        tables was invalidated since, the result may predate that write
+        and is dropped.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.monotonic() + ttl if ttl else None
+        tables = frozenset(tables)
+        with self._lock:
+            if generation is not None and generation != sum(
+                    self._generations.get(t, 0) for t in tables):
+                self._stats["stale_sets"] += 1
+                return
+            self._entries[key] = (expires, tables, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, tables, database=None):
+        """Drop entries that read any of `tables`; returns how many."""
+        with self._lock:
+            for table in tables:
+                self._generations[table] = self._generations.get(table, 0) + 1
+            stale = [
+                key for key, (_, read, _) in self._entries.items()
+                if read & tables and (database is None or key[0] == database)
+            ]
+            for key in stale:
+                del self._entries[key]
+            self._stats["invalidations"] += len(stale)
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Hit/miss/eviction counters plus the current size."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        served = stats["hits"] + stats["stale_hits"]
+        lookups = served + stats["misses"]
+        stats["hit_rate"] = served / lookups if lookups else 0.0
+        return stats
+
+
+class SharedQueryCache:
+    """QueryCache-compatible result cache kept in a SQLite file.
+
+    Every process that opens the same `path` sees the same entries, so a
+    result cached by one worker is served to the others. Values are
+    pickled (and zlib-compressed once they pass `compress_min` bytes),
+    expire after `ttl` seconds of wall-clock time and are evicted least
+    recently used first once the store holds more than `max_bytes`.
+
+    invalidate_tables() reaches this cache like any other, and since the
+    delete happens in the shared file, a write committed in one process
+    invalidates the entries for every process. Only point it at a file
+    you trust: entries are unpickled on read.
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS entries (
+            key BLOB PRIMARY KEY,
+            db TEXT NOT NULL,
+            value BLOB NOT NULL,
+            size INTEGER NOT NULL,
+            expires REAL,
+            accessed REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries (accessed);
+        CREATE TABLE IF NOT EXISTS entry_tables (
+            tbl TEXT NOT NULL,
+            key BLOB NOT NULL,
+            PRIMARY KEY (tbl, key)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS generations (
+            tbl TEXT PRIMARY KEY,
+            gen INTEGER NOT NULL
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS usage (
+            id INTEGER PRIMARY KEY CHECK (id = 0),
+            bytes INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO usage VALUES (0, 0);
+        CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries
+        BEGIN
+            UPDATE usage SET bytes = bytes + NEW.size;
+        END;
+        CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries
+        BEGIN
+            UPDATE usage SET bytes = bytes - OLD.size;
+            DELETE FROM entry_tables WHERE key = OLD.key;
+        END;
+    """
+
+    def __init__(self, path, max_bytes=64 * 1024 * 1024, ttl=300.0,
+                 stale_ttl=0.0, compress_min=1024, timeout=5.0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.compress_min = compress_min
+        self._conn = sqlite3.connect(
+            path, timeout=timeout, isolation_level=None,
+            check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(f"BEGIN IMMEDIATE; {self._SCHEMA} COMMIT;")
+        self._lock = threading.Lock()
+        self._stats = dict.fromkeys(
+            ("hits", "stale_hits", "misses", "evictions", "expirations",
+             "invalidations", "unpicklable", "stale_sets"), 0)
+        _caches.add(self)
+
+    @contextmanager
+    def _transaction(self):
+        # IMMEDIATE takes the write lock up front, so two processes
+        # updating the store queue on busy_timeout instead of deadlocking.
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    @staticmethod
+    def _digest(key):
+        return hashlib.blake2b(repr(key).encode(), digest_size=16).digest()
+
+    def _dumps(self, value):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(data) >= self.compress_min:
+            return b"z" + zlib.compress(data)
+        return b"p" + data
+
+    @staticmethod
+    def _loads(blob):
+        data = blob[1:]
+        if blob[:1] == b"z":
+            data = zlib.decompress(data)
+        return pickle.loads(data)
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def lookup(self, key):
+        """Return (value, stale) for `key`, like QueryCache.lookup()."""
+        digest = self._digest(key)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires, accessed FROM entries WHERE key = ?",
+                (digest,)).fetchone()
+            if row is None:
+                self._stats["misses"] += 1
+                return MISSING, False
+            blob, expires, accessed = row
+            stale = expires is not None and expires <= now
+            if stale and expires + self.stale_ttl <= now:
+                with self._transaction():
+                    self._conn.execute(
+                        "DELETE FROM entries WHERE key = ? AND expires <= ?",
+                        (digest, now - self.stale_ttl))
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return MISSING, False
+            # Bumping the LRU clock is a write; once a second per entry is
+            # enough to order evictions.
+            if now - accessed >= 1.0:
+                self._conn.execute(
+                    "UPDATE entries SET accessed = ? WHERE key = ?",
+                    (now, digest))
+            self._stats["stale_hits" if stale else "hits"] += 1
+        return self._loads(blob), stale
+
+    def get(self, key):
+        """Return the fresh cached value for `key`, or MISSING."""
+        value, stale = self.lookup(key)
+        return MISSING if stale else value
+
+    def _generation(self, tables):
+        tables = sorted(tables)
+        marks = ", ".join("?" * len(tables))
+        return self._conn.execute(
+            f"SELECT COALESCE(SUM(gen), 0) FROM generations "
+            f"WHERE tbl IN ({marks})", tables).fetchone()[0]
+
+    def generation(self, tables):
+        """Token that changes whenever any of `tables` is invalidated."""
+        with self._lock:
+            return self._generation(tables)
+
+    def set(self, key, value, tables=(), ttl=None, generation=None):
+        """Store `value`, like QueryCache.set()."""
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        expires = now + ttl if ttl else None
+        digest = self._digest(key)
+        try:
+            blob = self._dumps(value)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            # e.g. sqlite3.Row results: serve them uncached rather than
+            # fail a query that has already run.
+            with self._lock:
+                self._stats["unpicklable"] += 1
+            return
+        if len(blob) > self.max_bytes:
+            return
+        with self._lock, self._transaction():
+            # Checked inside the write transaction, so an invalidation
+            # from another process cannot slip in before the insert.
+            if (generation is not None
+                    and generation != self._generation(tables)):
+                self._stats["stale_sets"] += 1
+                return
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (digest,))
+            self._conn.execute(
+                "INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                (digest, key[0], blob, len(blob), expires, now))
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO entry_tables VALUES (?, ?)",
+                [(table.lower(), digest) for table in tables])
+            self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries until under max_bytes."""
+        used = self._conn.execute("SELECT bytes FROM usage").fetchone()[0]
+        while used > self.max_bytes:
+            victims = self._conn.execute(
+                "SELECT key, size FROM entries ORDER BY accessed LIMIT 32"
+            ).fetchall()
+            if not victims:
+                break
+            for victim, size in victims:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (victim,))
+                self._stats["evictions"] += 1
+                used -= size
+                if used <= self.max_bytes:
+                    break
+
+    def invalidate(self, tables, database=None):
+        """Drop entries that read any of `tables`, in every process."""
+        tables = sorted(tables)
+        marks = ", ".join("?" * len(tables))
+        sql = (f"DELETE FROM entries WHERE key IN (SELECT key FROM "
+               f"entry_tables WHERE tbl IN ({marks}))")
+        params = list(tables)
+        if database is not None:
+            sql += " AND db = ?"
+            params.append(database)
+        with self._lock, self._transaction():
+            self._conn.executemany(
+                "INSERT INTO generations VALUES (?, 1) "
+                "ON CONFLICT (tbl) DO UPDATE SET gen = gen + 1",
+                [(table,) for table in tables])
+            dropped = self._conn.execute(sql, params).rowcount
+            self._stats["invalidations"] += dropped
+        return dropped
+
+    def clear(self):
+        with self._lock, self._transaction():
+            self._conn.execute("DELETE FROM entries")
+
+    def stats(self):
+        """This process's hit/miss counters plus the shared store's size."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"], stats["bytes"] = self._conn.execute(
+                "SELECT COUNT(*), (SELECT bytes FROM usage) FROM entries"
+            ).fetchone()
+        served = stats["hits"] + stats["stale_hits"]
+        lookups = served + stats["misses"]
+        stats["hit_rate"] = served / lookups if lookups else 0.0
+        return stats
+
+    def close(self):
+        _caches.discard(self)
+        with self._lock:
+            self._conn.close()
+
+
+class SingleFlight:
+    """Collapse concurrent calls for the same key into one execution.
+
+    The first thread to call do() for a key runs the loader. Threads that
+    arrive while it is running block on its result, or on its exception.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def _claim(self, key):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                return call, False
+            call = self._calls[key] = Future()
+            return call, True
+
+    def _run(self, key, call, load):
+        try:
+            result = load()
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def do(self, key, load):
+        """Return load(), sharing it with concurrent callers of key."""
+        call, leader = self._claim(key)
+        if not leader:
+            return call.result()
+        return self._run(key, call, load)
+
+    def refresh(self, key, load):
+        """Run load() on a background thread unless key is already in flight."""
+        call, leader = self._claim(key)
+        if leader:
+            threading.Thread(target=self._background, args=(key, call, load),
+                             daemon=True).start()
+
+    def _background(self, key, call, load):
+        try:
+            self._run(key, call, load)
+        except Exception:
+            pass  # the stale value stays in place until the next attempt
+
+
+class AsyncSingleFlight:
+    """Collapse concurrent coroutine calls for the same key into one.
+
+    The first caller for a key runs the loader; callers that arrive while
+    it is in flight await the same result (or exception). If the first
+    caller is cancelled, the callers waiting on it are cancelled as well.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._tasks = set()
+
+    async def do(self, key, load):
+        """Return await load(), sharing it with concurrent callers of key."""
+        loop = asyncio.get_running_loop()
+        flight = (loop, key)
+        future = self._calls.get(flight)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = self._calls[flight] = loop.create_future()
+        try:
+            result = await load()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved when nobody was waiting
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[flight]
+
+    def refresh(self, key, load):
+        """Run load() as a background task unless key is already in flight."""
+        flight = (asyncio.get_running_loop(), key)
+        if flight in self._calls:
+            return
+        task = asyncio.ensure_future(self.do(key, load))
+        self._tasks.add(task)
+        task.add_done_callback(self._finished)
+
+    def _finished(self, task):
+        self._tasks.discard(task)
+        if not task.cancelled():
+            task.exception()  # a failed refresh leaves the stale value
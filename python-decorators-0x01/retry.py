@@ -0,0 +1,125 @@
+"""Retry decorator with exponential backoff, jitter and a retry budget.
+
+Retries are spread out with "full jitter": before retry n the decorator
+sleeps a random time in [0, min(max_delay, delay * 2**n)), so workers that
+failed together do not all retry together. Only errors that
+is_retryable() accepts are retried. All decorated functions in the
+process share a RetryBudget, which refuses further retries once retries
+make up too large a share of recent calls. That keeps an overloaded
+database from also being hit by a retry storm.
+"""
+import asyncio
+import functools
+import inspect
+import random
+import sqlite3
+import threading
+import time
+
+_TRANSIENT_MESSAGES = ("database is locked", "database table is locked",
+                       "database is busy", "disk i/o error")
+
+
+def is_retryable(exc):
+    """True for errors that may succeed on retry (locks, timeouts, I/O)."""
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    if isinstance(exc, sqlite3.OperationalError):
+        message = str(exc).lower()
+        return any(text in message for text in _TRANSIENT_MESSAGES)
+    return False
+
+
+def backoff_delay(attempt, delay, max_delay):
+    """Full-jitter sleep before retry number `attempt` (1-based)."""
+    return random.uniform(0, min(max_delay, delay * 2 ** (attempt - 1)))
+
+
+class RetryBudget:
+    """Allow retries only while they are a small share of recent calls.
+
+    Over a sliding window of `window` seconds, retries are allowed while
+    retries < max(min_retries, ratio * calls). Otherwise the failure is
+    raised without retrying, like an open circuit breaker.
+    """
+
+    def __init__(self, ratio=0.2, min_retries=10, window=10):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window
+        self._buckets = {}  # whole second -> [calls, retries]
+        self._lock = threading.Lock()
+        self.denied = 0
+
+    def _totals(self, now):
+        horizon = now - self.window
+        for second in [s for s in self._buckets if s <= horizon]:
+            del self._buckets[second]
+        calls = sum(b[0] for b in self._buckets.values())
+        retries = sum(b[1] for b in self._buckets.values())
+        return calls, retries
+
+    def _bucket(self, now):
+        return self._buckets.setdefault(int(now), [0, 0])
+
+    def record_call(self):
+        with self._lock:
+            self._bucket(time.monotonic())[0] += 1
+
+    def try_retry(self):
+        """Reserve one retry; False when the budget is exhausted."""
+        with self._lock:
+            now = time.monotonic()
+            calls, retries = self._totals(now)
+            if retries >= max(self.min_retries, self.ratio * calls):
+                self.denied += 1
+                return False
+            self._bucket(now)[1] += 1
+            return True
+
+
+default_budget = RetryBudget()
+
+
+def retry_on_failure(retries=3, delay=2, max_delay=30, retry_if=is_retryable,
+                     budget=default_budget):
+    """Retry a function up to `retries` attempts on retryable errors.
+
+    `delay` is the base of the exponential backoff. Pass budget=None to
+    opt out of the shared retry budget. Works on both regular functions
+    and coroutine functions; the latter back off with asyncio.sleep.
+    """
+    def should_retry(attempt, e):
+        print(f"Attempt {attempt} failed: {e}")
+        return (attempt < retries and retry_if(e)
+                and (budget is None or budget.try_retry()))
+
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if budget is not None:
+                    budget.record_call()
+                for attempt in range(1, retries + 1):
+                    try:
+                        return await func(*args, **kwargs)
+                    except Exception as e:
+                        if not should_retry(attempt, e):
+                            raise
+                    await asyncio.sleep(
+                        backoff_delay(attempt, delay, max_delay))
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if budget is not None:
+                budget.record_call()
+            for attempt in range(1, retries + 1):
+                try:
+                    return func(*args, **kwargs)
+                except Exception as e:
+                    if not should_retry(attempt, e):
+                        raise
+                time.sleep(backoff_delay(attempt, delay, max_delay))
+        return wrapper
+    return decorator
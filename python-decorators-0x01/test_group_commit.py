@@ -0,0 +1,50 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from db_pool import PoolTimeout, get_pool
+from group_commit import GroupCommitter, group_transactional
+
+
+class GroupCommitterRecoveryTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.database = os.path.join(tmp.name, "users.db")
+        conn = sqlite3.connect(self.database)
+        conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT)")
+        conn.execute("INSERT INTO users (name) VALUES ('a')")
+        conn.commit()
+        conn.close()
+        self.pool = get_pool(self.database, size=1, timeout=0.2)
+        self.addCleanup(self.pool.close)
+        self.committer = GroupCommitter(self.database)
+        self.addCleanup(self.committer.close)
+
+        @group_transactional(committer=self.committer)
+        def rename(conn, name):
+            conn.execute("UPDATE users SET name = ? WHERE id = 1", (name,))
+            return name
+        self.rename = rename
+
+    def test_writer_restarts_after_checkout_timeout(self):
+        held = self.pool.checkout()
+        try:
+            future = self.rename.submit("b")
+            with self.assertRaises(PoolTimeout):
+                future.result(timeout=5)
+        finally:
+            self.pool.release(held)
+
+        # The failed writer must not strand later writes.
+        self.assertEqual(self.rename.submit("c").result(timeout=5), "c")
+        self.committer.close()
+        with self.pool.connection() as conn:
+            self.assertEqual(
+                conn.execute("SELECT name FROM users").fetchone()[0], "c")
+
+
+if __name__ == "__main__":
+    unittest.main()
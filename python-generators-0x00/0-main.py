@@ -18,7 +18,7 @@ if connection:
         result = cursor.fetchone()
         if result:
             print(f"Database ALX_prodev is present ")
-        cursor.execute(f"SELECT * FROM user_data LIMIT 5;")
+        cursor.execute(f"{seed.USER_DATA_SELECT} LIMIT 5;")
         rows = cursor.fetchall()
         print(rows)
         cursor.close()
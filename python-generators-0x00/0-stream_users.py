@@ -1,19 +1,24 @@
-import mysql.connector
+import connection_pool
+import seed
 
-def stream_users():
-    connection = mysql.connector.connect(
-        host="localhost",
-        user="root",
-        password="Better9ja",  # 🔁 Replace with your real password
-        database="ALX_prodev"
-    )
-    cursor = connection.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM user_data")
+def stream_users(buffered=False):
+    """Generator that yields users one row at a time.
 
-    for row in cursor:
-        # convert Decimal to int for "age" if needed
-        row["age"] = int(row["age"])
-        yield row
+    By default the cursor is unbuffered: rows are read off the socket only
+    as the generator advances, so client memory stays flat however large
+    user_data is. Pass buffered=True to pull the whole result set up front.
+    """
+    connection = connection_pool.get_pool().checkout()
+    cursor = connection.cursor(dictionary=True, buffered=buffered)
+    try:
+        cursor.execute(seed.USER_DATA_SELECT)
 
-    cursor.close()
-    connection.close()
+        for row in cursor:
+            # convert Decimal to int for "age" if needed
+            row["age"] = int(row["age"])
+            yield row
+    finally:
+        # Closing the connection rather than the cursor lets a stream that
+        # was abandoned early (e.g. islice) drop its unread rows instead of
+        # draining the rest of the table first.
+        connection.close()
@@ -1,29 +1,53 @@
-import mysql.connector
-
-def stream_users_in_batches(batch_size):
-    connection = mysql.connector.connect(
-        host="localhost",
-        user="root",
-        password="Better9ja",  
-        database="ALX_prodev"
-    )
-    cursor = connection.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM user_data")
-
-    while True:
-        batch = cursor.fetchmany(batch_size)
-        if not batch:
-            return
-        for row in batch:
-            row["age"] = int(row["age"])
-        yield batch
-
-    cursor.close()
-    connection.close()
-
-
-def batch_processing(batch_size):
-    for batch in stream_users_in_batches(batch_size):
+import connection_pool
+import seed
+from column_batch import ColumnBatch
+from resumable_batches import run_resumable
+
+def stream_users_in_batches(batch_size, buffered=False, columnar=False):
+    """Generator that yields lists of at most batch_size users.
+
+    With the default unbuffered cursor only one batch is held in client
+    memory at a time; buffered=True fetches the full result set first.
+    With columnar=True each batch is a ColumnBatch instead of a list of
+    dicts.
+    """
+    connection = connection_pool.get_pool().checkout()
+    cursor = connection.cursor(dictionary=not columnar, buffered=buffered)
+    try:
+        cursor.execute(seed.USER_DATA_SELECT)
+
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                return
+            if columnar:
+                yield ColumnBatch.from_rows(batch)
+                continue
+            for row in batch:
+                row["age"] = int(row["age"])
+            yield batch
+    finally:
+        connection.close()
+
+
+def batch_processing(batch_size, buffered=False, columnar=False):
+    for batch in stream_users_in_batches(batch_size, buffered, columnar):
+        if columnar:
+            for user in batch.where(batch.mask("age", ">", 25)).rows():
+                print(user)
+            continue
         for user in batch:
             if user["age"] > 25:
                 print(user)
+
+
+def resumable_batch_processing(batch_size,
+                               checkpoint_path="batch_processing.ckpt"):
+    """batch_processing that resumes from its checkpoint after a restart."""
+    def print_older_users(batch):
+        for user in batch:
+            if user["age"] > 25:
+                print(user)
+
+    return run_resumable(print_older_users, checkpoint_path,
+                         "batch_processing", batch_size)
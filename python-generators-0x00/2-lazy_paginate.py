@@ -1,13 +1,20 @@
+import base64
+import json
+
+import connection_pool
 import seed
 
 def paginate_users(page_size, offset):
     connection = seed.connect_to_prodev()
-    cursor = connection.cursor(dictionary=True)
-    cursor.execute(f"SELECT * FROM user_data LIMIT {page_size} OFFSET {offset}")
-    rows = cursor.fetchall()
+    try:
+        cursor = connection.cursor(dictionary=True)
+        cursor.execute(
+            f"{seed.USER_DATA_SELECT} LIMIT {page_size} OFFSET {offset}")
+        rows = cursor.fetchall()
+    finally:
+        connection.close()
     for row in rows:
         row["age"] = int(row["age"])
-    connection.close()
     return rows
 
 
@@ -19,3 +26,78 @@ def lazy_pagination(page_size):
             break
         yield page  # ✅ Yield one page at a time
         offset += page_size
+
+
+def seek_values(row, key):
+    """Values a keyset walk seeks past; user_id breaks ties on other keys."""
+    if key == "user_id":
+        return [row["user_id"]]
+    return [row[key], row["user_id"]]
+
+
+def keyset_query(page_size, key="user_id", after=None):
+    """Build the (query, params) pair for the page following `after`.
+
+    `key` must be a user_data column, ideally an indexed one. Non-unique
+    keys are ordered by (key, user_id) so every row is visited exactly once.
+    """
+    if key not in seed.USER_DATA_COLUMNS:
+        raise ValueError(f"Cannot paginate user_data on {key!r}")
+    if key == "user_id":
+        order, seek = "user_id", "user_id > %s"
+    else:
+        order, seek = f"{key}, user_id", f"({key}, user_id) > (%s, %s)"
+    where = f"WHERE {seek} " if after is not None else ""
+    params = tuple(after or ()) + (page_size,)
+    return (f"{seed.USER_DATA_SELECT} {where}ORDER BY {order} LIMIT %s",
+            params)
+
+
+def next_page_token(page, key="user_id"):
+    """Return an opaque token that resumes a keyset walk after `page`."""
+    state = {"key": key, "after": seek_values(page[-1], key)}
+    return base64.urlsafe_b64encode(json.dumps(state).encode()).decode()
+
+
+def decode_page_token(token, key="user_id"):
+    """Return the seek values stored in a token made by next_page_token."""
+    try:
+        state = json.loads(base64.urlsafe_b64decode(token.encode()))
+    except ValueError as err:
+        raise ValueError(f"Invalid page token: {err}") from None
+    if not isinstance(state, dict) or "after" not in state:
+        raise ValueError("Invalid page token")
+    if state.get("key") != key:
+        raise ValueError(
+            f"Page token was issued for key {state.get('key')!r}, not {key!r}")
+    return state["after"]
+
+
+def keyset_pagination(page_size, key="user_id", token=None, connection=None):
+    """Generator that yields pages by seeking past the last key seen.
+
+    Unlike lazy_pagination every page is an index seek, so walking the
+    whole table is linear, and one connection is reused for the walk.
+    Pass a token from next_page_token() to resume after that page.
+    """
+    after = decode_page_token(token, key) if token else None
+    own_connection = connection is None
+    if own_connection:
+        connection = connection_pool.get_pool().checkout()
+    cursor = connection.cursor(dictionary=True)
+    try:
+        while True:
+            cursor.execute(*keyset_query(page_size, key, after))
+            page = cursor.fetchall()
+            if not page:
+                return
+            for row in page:
+                row["age"] = int(row["age"])
+            yield page
+            if len(page) < page_size:
+                return
+            after = seek_values(page[-1], key)
+    finally:
+        cursor.close()
+        if own_connection:
+            connection.close()
@@ -3,14 +3,16 @@ import seed
 def stream_user_ages():
     """Generator that yields user ages one at a time"""
     connection = seed.connect_to_prodev()
-    cursor = connection.cursor(dictionary=True)
-    cursor.execute("SELECT age FROM user_data")
+    try:
+        cursor = connection.cursor(dictionary=True)
+        cursor.execute("SELECT age FROM user_data")
 
-    for row in cursor:
-        yield int(row["age"])  # ✅ yield each age
+        for row in cursor:
+            yield int(row["age"])  # ✅ yield each age
 
-    cursor.close()
-    connection.close()
+        cursor.close()
+    finally:
+        connection.close()  # ✅ hands the pooled connection back
 
 
 def compute_average_age():
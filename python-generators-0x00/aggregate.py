@@ -0,0 +1,259 @@
+"""Summary statistics over user_data columns.
+
+summarize() and histogram() push the work down to MySQL as aggregate
+queries so only the results cross the wire. The *_stream variants compute
+the same figures in a single pass over any iterable of numbers (such as
+stream_user_ages()) in constant memory, and are used when push_down=False.
+"""
+import math
+from bisect import bisect_right
+
+import connection_pool
+
+NUMERIC_COLUMNS = ("age",)
+
+
+def _number(value):
+    """Convert a Decimal/float from MySQL into an int or float."""
+    if value is None:
+        return None
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+
+def _check_percentiles(percentiles):
+    for p in percentiles:
+        if not 0 < p < 100:
+            raise ValueError(f"Percentiles must be between 0 and 100: {p}")
+
+
+def _check_column(column):
+    if column not in NUMERIC_COLUMNS:
+        raise ValueError(f"Cannot aggregate user_data on {column!r}")
+
+
+class RunningStats:
+    """Welford's online count, mean and sample variance, plus min and max."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.min = None
+        self.max = None
+        self._m2 = 0.0
+
+    def push(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    @property
+    def stddev(self):
+        if self.count < 2:
+            return None
+        return math.sqrt(self._m2 / (self.count - 1))
+
+
+class StreamingQuantile:
+    """P-square estimate of one quantile using five markers.
+
+    See Jain & Chlamtac, "The P2 algorithm for dynamic calculation of
+    quantiles and histograms without storing observations" (1985).
+    """
+
+    def __init__(self, quantile):
+        q = quantile
+        self.quantile = q
+        self._heights = []
+        self._positions = [1, 2, 3, 4, 5]
+        self._desired = [1, 1 + 2 * q, 1 + 4 * q, 3 + 2 * q, 5]
+        self._increments = [0, q / 2, q, (1 + q) / 2, 1]
+
+    def push(self, value):
+        h, n = self._heights, self._positions
+        if len(h) < 5:
+            h.append(value)
+            h.sort()
+            return
+
+        if value < h[0]:
+            h[0] = value
+            k = 0
+        elif value >= h[4]:
+            h[4] = value
+            k = 3
+        else:
+            k = bisect_right(h, value) - 1
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self._desired[i] += self._increments[i]
+
+        for i in (1, 2, 3):
+            d = self._desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (
+                    d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                height = self._parabolic(i, d)
+                if not h[i - 1] < height < h[i + 1]:
+                    height = h[i] + d * (h[i + d] - h[i]) / (n[i + d] - n[i])
+                h[i] = height
+                n[i] += d
+
+    def _parabolic(self, i, d):
+        h, n = self._heights, self._positions
+        return h[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (h[i + 1] - h[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (h[i] - h[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    @property
+    def value(self):
+        h = self._heights
+        if not h:
+            return None
+        if len(h) < 5 or self._positions[4] == 5:
+            # Too few observations for the markers to move: exact rank.
+            return h[max(math.ceil(self.quantile * len(h)) - 1, 0)]
+        return h[2]
+
+
+def summarize_stream(values, percentiles=(50, 90, 99)):
+    """Single-pass count/mean/min/max/stddev/percentiles over `values`.
+
+    Percentiles are P-square estimates; None values are skipped.
+    """
+    _check_percentiles(percentiles)
+    stats = RunningStats()
+    estimators = {p: StreamingQuantile(p / 100) for p in percentiles}
+    for value in values:
+        if value is None:
+            continue
+        stats.push(value)
+        for estimator in estimators.values():
+            estimator.push(value)
+
+    empty = stats.count == 0
+    return {
+        "count": stats.count,
+        "mean": None if empty else stats.mean,
+        "min": stats.min,
+        "max": stats.max,
+        "stddev": stats.stddev,
+        "percentiles": {p: e.value for p, e in estimators.items()},
+    }
+
+
+def histogram_stream(values, width, origin=0):
+    """Count `values` into buckets [origin + k*width, origin + (k+1)*width).
+
+    Memory grows with the number of distinct buckets, not with the input.
+    """
+    counts = {}
+    for value in values:
+        if value is None:
+            continue
+        start = origin + math.floor((value - origin) / width) * width
+        counts[start] = counts.get(start, 0) + 1
+    return dict(sorted(counts.items()))
+
+
+def _stream_column(connection, column):
+    cursor = connection.cursor(buffered=False)
+    try:
+        cursor.execute(f"SELECT {column} FROM user_data")
+        for (value,) in cursor:
+            yield _number(value)
+    finally:
+        cursor.close()
+
+
+def _with_connection(connection, func):
+    if connection is not None:
+        return func(connection)
+    connection = connection_pool.get_pool().checkout()
+    try:
+        return func(connection)
+    finally:
+        connection.close()
+
+
+def summarize(column="age", percentiles=(50, 90, 99), connection=None,
+              push_down=True):
+    """Summary statistics for a numeric user_data column.
+
+    With push_down=True (the default) COUNT/AVG/MIN/MAX/STDDEV_SAMP run in
+    MySQL and each percentile is a single ORDER BY ... LIMIT 1 OFFSET k
+    lookup (nearest rank). Otherwise the column is streamed through
+    summarize_stream().
+    """
+    _check_column(column)
+    _check_percentiles(percentiles)
+
+    def run(connection):
+        if not push_down:
+            return summarize_stream(
+                _stream_column(connection, column), percentiles)
+
+        cursor = connection.cursor()
+        try:
+            cursor.execute(
+                f"SELECT COUNT({column}), AVG({column}), MIN({column}), "
+                f"MAX({column}), STDDEV_SAMP({column}) FROM user_data")
+            count, mean, low, high, stddev = cursor.fetchone()
+            ranks = {}
+            for p in percentiles if count else ():
+                offset = max(math.ceil(p / 100 * count) - 1, 0)
+                cursor.execute(
+                    f"SELECT {column} FROM user_data WHERE {column} IS NOT NULL "
+                    f"ORDER BY {column} LIMIT 1 OFFSET %s", (offset,))
+                ranks[p] = _number(cursor.fetchone()[0])
+        finally:
+            cursor.close()
+        return {
+            "count": count,
+            "mean": None if mean is None else float(mean),
+            "min": _number(low),
+            "max": _number(high),
+            "stddev": None if stddev is None else float(stddev),
+            "percentiles": {p: ranks.get(p) for p in percentiles},
+        }
+
+    return _with_connection(connection, run)
+
+
+def histogram(column="age", width=10, origin=0, connection=None,
+              push_down=True):
+    """Bucket counts for a numeric user_data column, keyed by bucket start.
+
+    With push_down=True the bucketing is a GROUP BY in MySQL; otherwise the
+    column is streamed through histogram_stream().
+    """
+    _check_column(column)
+    if width <= 0:
+        raise ValueError(f"Histogram width must be positive: {width}")
+
+    def run(connection):
+        if not push_down:
+            return histogram_stream(
+                _stream_column(connection, column), width, origin)
+
+        cursor = connection.cursor()
+        try:
+            cursor.execute(
+                f"SELECT FLOOR(({column} - %s) / %s) AS bucket, COUNT(*) "
+                f"FROM user_data WHERE {column} IS NOT NULL "
+                f"GROUP BY bucket ORDER BY bucket", (origin, width))
+            return {
+                _number(origin + bucket * width): count
+                for bucket, count in cursor.fetchall()
+            }
+        finally:
+            cursor.close()
+
+    return _with_connection(connection, run)
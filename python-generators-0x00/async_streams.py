@@ -0,0 +1,91 @@
+"""Async generator counterparts of the user_data streaming helpers.
+
+    async for user in astream_users():
+        ...
+
+mysql.connector is a blocking driver, so every call that touches the
+socket (checkout, execute, fetchmany, close) runs in the event loop's
+default thread pool via asyncio.to_thread. Only one batch or page is
+fetched per hop, and the loop stays free in between. Connections come
+from the shared pool in connection_pool. Concurrent consumers on one loop
+are capped at the pool size, so they queue on a semaphore instead of
+tying up executor threads in a blocking checkout.
+"""
+import asyncio
+import contextlib
+import weakref
+
+import connection_pool
+from column_batch import COLUMNS, ColumnBatch
+
+lazy_paginate = __import__('2-lazy_paginate')
+
+_loop_slots = weakref.WeakKeyDictionary()
+
+
+def _slots():
+    loop = asyncio.get_running_loop()
+    if loop not in _loop_slots:
+        _loop_slots[loop] = asyncio.Semaphore(connection_pool.get_pool().size)
+    return _loop_slots[loop]
+
+
+@contextlib.asynccontextmanager
+async def _connection():
+    async with _slots():
+        connection = await asyncio.to_thread(
+            connection_pool.get_pool().checkout)
+        try:
+            yield connection
+        finally:
+            await asyncio.to_thread(connection.close)
+
+
+async def astream_users_in_batches(batch_size, columnar=False):
+    """Async generator yielding lists of at most batch_size users.
+
+    With columnar=True each batch is a ColumnBatch instead.
+    """
+    async with _connection() as connection:
+        cursor = connection.cursor(dictionary=not columnar)
+        await asyncio.to_thread(
+            cursor.execute, f"SELECT {', '.join(COLUMNS)} FROM user_data")
+        while True:
+            rows = await asyncio.to_thread(cursor.fetchmany, batch_size)
+            if not rows:
+                return
+            if columnar:
+                yield ColumnBatch.from_rows(rows)
+                continue
+            for row in rows:
+                row["age"] = int(row["age"])
+            yield rows
+
+
+async def astream_users(batch_size=100):
+    """Async generator yielding users one at a time.
+
+    Rows are still fetched batch_size at a time to keep thread hops rare.
+    """
+    async for batch in astream_users_in_batches(batch_size):
+        for user in batch:
+            yield user
+
+
+async def akeyset_pagination(page_size, key="user_id", token=None):
+    """Async version of keyset_pagination from 2-lazy_paginate."""
+    after = lazy_paginate.decode_page_token(token, key) if token else None
+    async with _connection() as connection:
+        cursor = connection.cursor(dictionary=True)
+        while True:
+            query, params = lazy_paginate.keyset_query(page_size, key, after)
+            await asyncio.to_thread(cursor.execute, query, params)
+            page = await asyncio.to_thread(cursor.fetchall)
+            if not page:
+                return
+            for row in page:
+                row["age"] = int(row["age"])
+            yield page
+            if len(page) < page_size:
+                return
+            after = lazy_paginate.seek_values(page[-1], key)
@@ -0,0 +1,57 @@
+#!/usr/bin/python3
+"""Throughput of concurrent astream_users_in_batches consumers.
+
+Usage: ./bench_async.py [batch_size] [concurrency ...]
+
+Each consumer walks the whole of user_data. A ticker task records the
+worst event-loop stall, which should stay near the tick interval if no
+database call blocks the loop.
+"""
+import asyncio
+import sys
+import time
+
+import connection_pool
+from async_streams import astream_users_in_batches
+
+TICK = 0.01
+
+
+async def consume(batch_size):
+    rows = 0
+    async for batch in astream_users_in_batches(batch_size):
+        rows += len(batch)
+    return rows
+
+
+async def ticker(stalls):
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        stalls.append(time.perf_counter() - start - TICK)
+
+
+async def run(batch_size, concurrency):
+    stalls = []
+    tick = asyncio.create_task(ticker(stalls))
+    start = time.perf_counter()
+    counts = await asyncio.gather(
+        *(consume(batch_size) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    tick.cancel()
+    return sum(counts), elapsed, max(stalls, default=0.0)
+
+
+def main(batch_size, levels):
+    connection_pool.configure_pool(size=max(levels))
+    print(f"{'consumers':>10} {'rows':>10} {'total s':>9} "
+          f"{'rows/s':>10} {'max stall ms':>13}")
+    for concurrency in levels:
+        rows, elapsed, stall = asyncio.run(run(batch_size, concurrency))
+        print(f"{concurrency:>10} {rows:>10} {elapsed:>9.2f} "
+              f"{rows / elapsed:>10.0f} {stall * 1000:>13.1f}")
+
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    main(size, [int(arg) for arg in sys.argv[2:]] or [1, 2, 4, 8])
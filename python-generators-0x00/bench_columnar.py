@@ -0,0 +1,76 @@
+#!/usr/bin/python3
+"""Compare dict batches with ColumnBatch on an "age > 25" filter.
+
+Usage: ./bench_columnar.py [rows] [batch_size]
+
+Rows are synthetic tuples shaped like a user_data cursor row, so no
+database is needed. Reports rows/sec for convert + filter and the memory
+retained by one batch in each format.
+"""
+import sys
+import time
+import tracemalloc
+import uuid
+from decimal import Decimal
+
+from column_batch import COLUMNS, ColumnBatch, np
+
+
+def fake_rows(count):
+    return [
+        (str(uuid.uuid4()), f"User {i}", f"user{i}@example.com",
+         Decimal(18 + i % 80))
+        for i in range(count)
+    ]
+
+
+def dict_batch(rows):
+    batch = [dict(zip(COLUMNS, row)) for row in rows]
+    for row in batch:
+        row["age"] = int(row["age"])
+    return batch
+
+
+def dict_filter(batch):
+    return [user for user in batch if user["age"] > 25]
+
+
+def columnar_filter(batch):
+    return batch.where(batch.mask("age", ">", 25))
+
+
+def batch_bytes(build, rows):
+    """Bytes still allocated after building one batch from `rows`."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    batch = build(rows)
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del batch
+    return size
+
+
+def throughput(build, keep, rows, batch_size):
+    start = time.perf_counter()
+    for i in range(0, len(rows), batch_size):
+        keep(build(rows[i:i + batch_size]))
+    return len(rows) / (time.perf_counter() - start)
+
+
+def main(count, batch_size):
+    rows = fake_rows(count)
+    backend = "numpy" if np is not None else "array"
+    print(f"{count} rows, batch_size {batch_size}, ColumnBatch ages: {backend}")
+    print(f"{'format':>10} {'rows/s':>12} {'KiB/batch':>10}")
+    for name, build, keep in (
+        ("dict", dict_batch, dict_filter),
+        ("columnar", ColumnBatch.from_rows, columnar_filter),
+    ):
+        rate = throughput(build, keep, rows, batch_size)
+        size = batch_bytes(build, rows[:batch_size])
+        print(f"{name:>10} {rate:>12.0f} {size / 1024:>10.1f}")
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:3]]
+    main(*(args + [200000, 1000][len(args):]))
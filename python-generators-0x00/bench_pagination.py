@@ -0,0 +1,42 @@
+#!/usr/bin/python3
+"""Compare a full user_data walk with OFFSET vs keyset pagination.
+
+Usage: ./bench_pagination.py [page_size]
+
+Seed user_data with ~1M rows first (see 0-main.py). The OFFSET
+walk re-scans every skipped row and reconnects per page, so its per-page
+time grows with depth; the keyset walk should stay flat.
+"""
+import sys
+import time
+
+lazy_paginate = __import__('2-lazy_paginate')
+
+
+def walk(pages):
+    """Consume a page generator and return (rows, total_s, last_page_s)."""
+    rows = 0
+    start = last = time.perf_counter()
+    last_page = 0.0
+    for page in pages:
+        now = time.perf_counter()
+        last_page, last = now - last, now
+        rows += len(page)
+    return rows, time.perf_counter() - start, last_page
+
+
+def main(page_size):
+    print(f"{'strategy':>10} {'rows':>10} {'total s':>9} "
+          f"{'rows/s':>10} {'last page s':>12}")
+    for name, pages in (
+        ("offset", lazy_paginate.lazy_pagination(page_size)),
+        ("keyset", lazy_paginate.keyset_pagination(page_size)),
+    ):
+        rows, total, last_page = walk(pages)
+        rate = rows / total if total else 0.0
+        print(f"{name:>10} {rows:>10} {total:>9.2f} "
+              f"{rate:>10.0f} {last_page:>12.4f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
@@ -0,0 +1,54 @@
+#!/usr/bin/python3
+"""Compare peak client memory of buffered vs unbuffered user_data scans.
+
+Usage: ./bench_streaming.py [row_count ...]
+
+For each row count the same SELECT runs once with a buffered cursor and
+once with an unbuffered one. The unbuffered peak should stay roughly flat
+as the row count grows; the buffered peak grows with it.
+"""
+import sys
+import time
+import tracemalloc
+
+import seed
+
+
+def scan(connection, limit, buffered):
+    """Stream `limit` rows and return (peak_bytes, first_row_s, total_s)."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    first_row = None
+    cursor = connection.cursor(dictionary=True, buffered=buffered)
+    cursor.execute(f"{seed.USER_DATA_SELECT} LIMIT %s", (limit,))
+    for row in cursor:
+        if first_row is None:
+            first_row = time.perf_counter() - start
+        row["age"] = int(row["age"])
+    total = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    cursor.close()
+    return peak, first_row or 0.0, total
+
+
+def main(row_counts):
+    connection = seed.connect_to_prodev()
+    if not connection:
+        return
+    print(f"{'rows':>10} {'mode':>10} {'peak KiB':>10} "
+          f"{'first row s':>12} {'total s':>9}")
+    try:
+        for limit in row_counts:
+            for buffered in (True, False):
+                peak, first_row, total = scan(connection, limit, buffered)
+                mode = "buffered" if buffered else "stream"
+                print(f"{limit:>10} {mode:>10} {peak / 1024:>10.1f} "
+                      f"{first_row:>12.4f} {total:>9.3f}")
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    counts = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000]
+    main(counts)
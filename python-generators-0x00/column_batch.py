@@ -0,0 +1,84 @@
+"""Column-oriented batches of user_data rows.
+
+A ColumnBatch keeps each column in one sequence instead of allocating a
+dict per row: ages live in a typed int array and the string columns in
+tuples. When NumPy is installed ages are an int32 ndarray, so a filter such
+as batch.mask("age", ">", 25) is a single vectorized comparison.
+"""
+import operator
+from array import array
+from itertools import compress
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; fall back to array('i')
+    np = None
+
+COLUMNS = ("user_id", "name", "email", "age")
+
+_OPERATORS = {
+    "<": operator.lt,
+    "<=": operator.le,
+    "==": operator.eq,
+    "!=": operator.ne,
+    ">=": operator.ge,
+    ">": operator.gt,
+}
+
+
+def _int_array(values):
+    if np is not None:
+        return np.fromiter(
+            (int(v) for v in values), dtype=np.int32, count=len(values))
+    return array("i", (int(v) for v in values))
+
+
+class ColumnBatch:
+    """A batch of users stored as one sequence per column."""
+
+    __slots__ = COLUMNS
+
+    def __init__(self, user_id, name, email, age):
+        self.user_id = user_id
+        self.name = name
+        self.email = email
+        self.age = age
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build a batch from (user_id, name, email, age) tuples."""
+        if not rows:
+            return cls((), (), (), _int_array(()))
+        user_id, name, email, age = zip(*rows)
+        return cls(user_id, name, email, _int_array(age))
+
+    def __len__(self):
+        return len(self.user_id)
+
+    def mask(self, column, op, value):
+        """Boolean mask of rows where `column <op> value` holds."""
+        compare = _OPERATORS[op]
+        values = getattr(self, column)
+        if np is not None and isinstance(values, np.ndarray):
+            return compare(values, value)
+        return [compare(v, value) for v in values]
+
+    def where(self, mask):
+        """New batch holding only the rows selected by `mask`."""
+        if np is not None and isinstance(self.age, np.ndarray):
+            age = self.age[np.asarray(mask, dtype=bool)]
+        else:
+            age = array("i", compress(self.age, mask))
+        return ColumnBatch(
+            tuple(compress(self.user_id, mask)),
+            tuple(compress(self.name, mask)),
+            tuple(compress(self.email, mask)),
+            age,
+        )
+
+    def rows(self):
+        """Yield the batch back as row dicts."""
+        for user_id, name, email, age in zip(
+                self.user_id, self.name, self.email, self.age):
+            yield {"user_id": user_id, "name": name,
+                   "email": email, "age": int(age)}
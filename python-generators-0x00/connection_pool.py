@@ -0,0 +1,222 @@
+"""Process-wide MySQL connection pool shared by the generator scripts.
+
+Connection settings come from the environment so no script has to
+hardcode credentials:
+
+    ALX_DB_HOST, ALX_DB_PORT, ALX_DB_USER, ALX_DB_PASSWORD, ALX_DB_NAME
+    ALX_DB_POOL_SIZE (default 5), ALX_DB_POOL_TIMEOUT (seconds, default 30)
+
+Connections handed out by the pool are proxies: calling close() on them
+returns the underlying connection to the pool instead of disconnecting.
+"""
+import os
+import queue
+import threading
+import time
+import weakref
+
+import mysql.connector
+from mysql.connector import errors
+
+DB_NAME = os.environ.get("ALX_DB_NAME", "ALX_prodev")
+
+
+def db_config(database=DB_NAME):
+    """Connection arguments read from the environment."""
+    config = {
+        "host": os.environ.get("ALX_DB_HOST", "localhost"),
+        "port": int(os.environ.get("ALX_DB_PORT", "3306")),
+        "user": os.environ.get("ALX_DB_USER", "root"),
+        "password": os.environ.get("ALX_DB_PASSWORD", "Better9ja"),
+    }
+    if database:
+        config["database"] = database
+    return config
+
+
+class PoolExhaustedError(errors.PoolError):
+    """No connection became free within the checkout timeout."""
+
+
+def _close_quietly(connection):
+    try:
+        connection.close()
+    except errors.Error:
+        pass
+
+
+class PooledConnection:
+    """Proxy for a pooled connection; close() hands it back to the pool."""
+
+    def __init__(self, pool, connection):
+        self._pool = pool
+        self._connection = connection
+        # A proxy garbage-collected without close() still frees its slot.
+        self._release = weakref.finalize(self, pool.release, connection)
+
+    def __getattr__(self, name):
+        if self._connection is None:
+            raise errors.OperationalError(
+                "Connection has been returned to the pool")
+        return getattr(self._connection, name)
+
+    def __setattr__(self, name, value):
+        if name.startswith("_"):
+            super().__setattr__(name, value)
+        else:
+            setattr(self._connection, name, value)
+
+    def close(self):
+        if self._connection is not None:
+            self._connection = None
+            self._release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class ConnectionPool:
+    """Bounded pool of MySQL connections with checkout metrics.
+
+    At most `size` connections are checked out at once; further callers
+    block for up to `timeout` seconds and then get PoolExhaustedError.
+    Idle connections are pinged on checkout when health_check is set and
+    replaced if the server has dropped them.
+    """
+
+    def __init__(self, size=5, timeout=30.0, health_check=True, **config):
+        self.size = size
+        self.timeout = timeout
+        self.health_check = health_check
+        self._config = config
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._metrics = {
+            "checkouts": 0,
+            "waits": 0,
+            "exhausted": 0,
+            "total_wait_s": 0.0,
+            "max_wait_s": 0.0,
+            "created": 0,
+            "discarded": 0,
+            "health_check_failures": 0,
+            "in_use": 0,
+        }
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._metrics[name] += amount
+
+    def _take_idle(self):
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                return None
+            if not self.health_check or connection.is_connected():
+                return connection
+            self._count("health_check_failures")
+            _close_quietly(connection)
+
+    def checkout(self, timeout=None):
+        """Return a PooledConnection, waiting up to `timeout` seconds."""
+        timeout = self.timeout if timeout is None else timeout
+        start = time.perf_counter()
+        if not self._slots.acquire(blocking=False):
+            self._count("waits")
+            if not self._slots.acquire(timeout=timeout):
+                self._count("exhausted")
+                raise PoolExhaustedError(
+                    f"No connection free after {timeout}s "
+                    f"(pool size {self.size})")
+        waited = time.perf_counter() - start
+
+        try:
+            connection = self._take_idle()
+            if connection is None:
+                connection = mysql.connector.connect(**self._config)
+                self._count("created")
+        except BaseException:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._metrics["checkouts"] += 1
+            self._metrics["in_use"] += 1
+            self._metrics["total_wait_s"] += waited
+            self._metrics["max_wait_s"] = max(
+                self._metrics["max_wait_s"], waited)
+        return PooledConnection(self, connection)
+
+    def release(self, connection):
+        """Return a raw connection, discarding it if it is mid-result."""
+        try:
+            if connection.unread_result:
+                # An abandoned unbuffered stream: draining it could mean
+                # reading millions of rows, so drop the connection instead.
+                self._count("discarded")
+                _close_quietly(connection)
+            else:
+                if connection.in_transaction:
+                    connection.rollback()
+                self._idle.put(connection)
+        except errors.Error:
+            self._count("discarded")
+            _close_quietly(connection)
+        finally:
+            self._count("in_use", -1)
+            self._slots.release()
+
+    def close(self):
+        """Disconnect every idle connection."""
+        while True:
+            try:
+                _close_quietly(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+    def stats(self):
+        """Snapshot of the pool metrics, including mean checkout wait."""
+        with self._lock:
+            stats = dict(self._metrics)
+        stats["idle"] = self._idle.qsize()
+        stats["mean_wait_s"] = (
+            stats["total_wait_s"] / stats["checkouts"]
+            if stats["checkouts"] else 0.0)
+        return stats
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _pool_settings(**kwargs):
+    kwargs.setdefault("size", int(os.environ.get("ALX_DB_POOL_SIZE", "5")))
+    kwargs.setdefault(
+        "timeout", float(os.environ.get("ALX_DB_POOL_TIMEOUT", "30")))
+    for key, value in db_config().items():
+        kwargs.setdefault(key, value)
+    return kwargs
+
+
+def configure_pool(**kwargs):
+    """Replace the shared pool, e.g. configure_pool(size=20, timeout=5)."""
+    global _pool
+    with _pool_lock:
+        old, _pool = _pool, ConnectionPool(**_pool_settings(**kwargs))
+    if old is not None:
+        old.close()
+    return _pool
+
+
+def get_pool():
+    """Return the shared pool, creating it from the environment if needed."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(**_pool_settings())
+        return _pool
@@ -0,0 +1,127 @@
+"""Parallel partitioned scans of user_data.
+
+The table is split into partitions, either contiguous user_id ranges or
+CRC32 hash buckets. Each partition is streamed by a worker thread on its
+own pooled connection. Batches from all partitions are merged through a
+bounded queue. When the consumer falls behind, workers block on the queue
+instead of buffering the table in memory.
+
+    for batch in partitioned_scan(batch_size=500, partitions=8):
+        ...
+
+Batches arrive in completion order, not key order.
+"""
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import connection_pool
+from column_batch import COLUMNS, ColumnBatch
+
+_DONE = object()
+
+
+def user_id_ranges(partitions):
+    """Split the user_id key space into `partitions` [low, high) ranges.
+
+    user_id holds random UUIDs, so equal-width ranges of the leading hex
+    digits give evenly sized partitions. The outer bounds are open (None).
+    """
+    space = 16 ** 4
+    bounds = [format(space * i // partitions, "04x")
+              for i in range(1, partitions)]
+    return list(zip([None] + bounds, bounds + [None]))
+
+
+def partition_predicates(partitions, strategy="range"):
+    """Return one (where_clause, params) pair per partition."""
+    if partitions < 1:
+        raise ValueError(f"Need at least one partition: {partitions}")
+    if strategy == "hash":
+        return [("MOD(CRC32(user_id), %s) = %s", (partitions, bucket))
+                for bucket in range(partitions)]
+    if strategy != "range":
+        raise ValueError(f"Unknown partitioning strategy {strategy!r}")
+
+    predicates = []
+    for low, high in user_id_ranges(partitions):
+        clauses, params = [], []
+        if low is not None:
+            clauses.append("user_id >= %s")
+            params.append(low)
+        if high is not None:
+            clauses.append("user_id < %s")
+            params.append(high)
+        predicates.append((" AND ".join(clauses) or "1 = 1", tuple(params)))
+    return predicates
+
+
+def partitioned_scan(batch_size=1000, partitions=4, workers=None,
+                     strategy="range", queue_size=None, columnar=False):
+    """Generator yielding batches from all partitions as they are read.
+
+    `workers` defaults to min(partitions, pool size) so every worker can
+    hold a connection. The queue holds at most `queue_size` batches
+    (default twice the worker count). If a worker raises, the error is
+    re-raised here. Closing the generator early stops all workers.
+    """
+    pool = connection_pool.get_pool()
+    predicates = partition_predicates(partitions, strategy)
+    workers = workers or min(partitions, pool.size)
+    batches = queue.Queue(maxsize=queue_size or workers * 2)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                batches.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def scan(where, params):
+        if stop.is_set():
+            return
+        try:
+            connection = pool.checkout()
+            try:
+                cursor = connection.cursor(dictionary=not columnar)
+                cursor.execute(
+                    f"SELECT {', '.join(COLUMNS)} FROM user_data "
+                    f"WHERE {where}", params)
+                while not stop.is_set():
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    if columnar:
+                        batch = ColumnBatch.from_rows(rows)
+                    else:
+                        batch = rows
+                        for row in batch:
+                            row["age"] = int(row["age"])
+                    if not put(batch):
+                        break
+            finally:
+                connection.close()
+        except Exception as err:
+            put(err)
+        put(_DONE)
+
+    executor = ThreadPoolExecutor(
+        max_workers=workers, thread_name_prefix="user_data-scan")
+    try:
+        for where, params in predicates:
+            executor.submit(scan, where, params)
+        remaining = len(predicates)
+        while remaining:
+            item = batches.get()
+            if item is _DONE:
+                remaining -= 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield item
+    finally:
+        stop.set()
+        executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,110 @@
+"""Checkpointed, resumable batch jobs over user_data.
+
+run_resumable() walks the table with keyset pagination and stores the
+page token of the last processed batch in a JSON checkpoint file. A job
+restarted after a crash resumes from that token instead of row zero.
+
+Two processing guarantees are supported:
+
+at-least-once
+    The checkpoint is written every `checkpoint_every` batches. After a
+    crash, up to that many batches are handed to the handler again.
+exactly-once
+    The checkpoint is written after every batch, and the handler is called
+    as handler(batch, idempotency_key). The key depends only on the job,
+    the batch size and the batch's starting position. A batch replayed
+    after a crash therefore gets the same key, and a sink that records the
+    keys it has applied can skip it.
+"""
+import hashlib
+import json
+import os
+
+lazy_paginate = __import__('2-lazy_paginate')
+
+SEMANTICS = ("at-least-once", "exactly-once")
+
+
+class Checkpoint:
+    """JSON checkpoint file replaced atomically on every save."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def save(self, state):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def idempotency_key(job_id, batch_size, token):
+    """Stable key for the batch that starts after `token`."""
+    raw = f"{job_id}|{batch_size}|{token or ''}".encode()
+    return hashlib.sha256(raw).hexdigest()[:32]
+
+
+def run_resumable(handler, checkpoint_path, job_id="batch_processing",
+                  batch_size=100, checkpoint_every=10,
+                  semantics="at-least-once", key="user_id",
+                  keep_done=False):
+    """Run handler over every batch of user_data, resuming if possible.
+
+    Returns the final checkpoint state. A completed job removes its
+    checkpoint, so the next run starts from the beginning. With
+    keep_done=True the checkpoint is kept and marked done instead, and
+    further runs do nothing until Checkpoint(path).clear() is called.
+    """
+    if semantics not in SEMANTICS:
+        raise ValueError(f"semantics must be one of {SEMANTICS}")
+    checkpoint = Checkpoint(checkpoint_path)
+    state = checkpoint.load() or {
+        "job": job_id, "key": key, "batch_size": batch_size,
+        "token": None, "batches": 0, "rows": 0, "done": False,
+    }
+    if (state["job"], state["key"], state["batch_size"]) != (
+            job_id, key, batch_size):
+        raise ValueError(
+            f"Checkpoint {checkpoint_path} belongs to job {state['job']!r} "
+            f"(key={state['key']}, batch_size={state['batch_size']})")
+    if state["done"]:
+        return state
+
+    exactly_once = semantics == "exactly-once"
+    every = 1 if exactly_once else checkpoint_every
+    unsaved = 0
+    for batch in lazy_paginate.keyset_pagination(
+            batch_size, key, state["token"]):
+        if exactly_once:
+            handler(batch, idempotency_key(job_id, batch_size, state["token"]))
+        else:
+            handler(batch)
+        state["token"] = lazy_paginate.next_page_token(batch, key)
+        state["batches"] += 1
+        state["rows"] += len(batch)
+        unsaved += 1
+        if unsaved >= every:
+            checkpoint.save(state)
+            unsaved = 0
+
+    state["done"] = True
+    if keep_done:
+        checkpoint.save(state)
+    else:
+        checkpoint.clear()
+    return state
@@ -1,15 +1,20 @@
 import mysql.connector
 import csv
+import time
 import uuid
+from itertools import islice
 
-DB_NAME = "ALX_prodev"
+import connection_pool
+
+DB_NAME = connection_pool.DB_NAME
+USER_DATA_COLUMNS = ("user_id", "name", "email", "age")
+# Readers name their columns: updated_at is only for change_stream.
+USER_DATA_SELECT = f"SELECT {', '.join(USER_DATA_COLUMNS)} FROM user_data"
 
 def connect_db():
     try:
         connection = mysql.connector.connect(
-            host="localhost",
-            user="root",
-            password="Better9ja"  # 👈 Update this
+            **connection_pool.db_config(database=None)
         )
         return connection
     except mysql.connector.Error as err:
@@ -25,13 +30,12 @@ def create_database(connection):
         print(f"Failed to create database: {err}")
 
 def connect_to_prodev():
+    """Check a connection to ALX_prodev out of the shared pool.
+
+    Calling close() on it returns it to the pool.
+    """
     try:
-        connection = mysql.connector.connect(
-            host="localhost",
-            user="root",
-            password="Better9ja",  # 👈 Update this
-            database=DB_NAME
-        )
+        connection = connection_pool.get_pool().checkout()
         return connection
     except mysql.connector.Error as err:
         print(f"Error connecting to {DB_NAME}: {err}")
@@ -46,7 +50,12 @@ def create_table(connection):
                 name VARCHAR(255) NOT NULL,
                 email VARCHAR(255) NOT NULL,
                 age DECIMAL NOT NULL,
-                INDEX(user_id)
+                updated_at TIMESTAMP(6) NOT NULL
+                    DEFAULT CURRENT_TIMESTAMP(6)
+                    ON UPDATE CURRENT_TIMESTAMP(6),
+                INDEX(user_id),
+                UNIQUE INDEX uq_user_data_email (email),
+                INDEX idx_user_data_updated_at (updated_at, user_id)
             );
         """)
         connection.commit()
@@ -78,11 +87,100 @@ def insert_data(connection, filename):
         cursor.close()
     except Exception as err:
         print(f"Error inserting data: {err}")
+
+def ensure_email_unique(connection):
+    """Add the unique email index to a user_data table created without it."""
+    cursor = connection.cursor()
+    cursor.execute("""
+        SELECT 1 FROM INFORMATION_SCHEMA.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'user_data'
+          AND COLUMN_NAME = 'email' AND NON_UNIQUE = 0
+        LIMIT 1;
+    """)
+    if cursor.fetchone() is None:
+        cursor.execute(
+            "ALTER TABLE user_data ADD UNIQUE INDEX uq_user_data_email (email);")
+    cursor.close()
+
+def add_change_tracking(connection):
+    """Add the updated_at column used by change_stream to an older table.
+
+    MySQL keeps it current on every INSERT and UPDATE; existing rows get
+    the time of the migration.
+    """
+    cursor = connection.cursor()
+    cursor.execute("""
+        SELECT 1 FROM INFORMATION_SCHEMA.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'user_data'
+          AND COLUMN_NAME = 'updated_at'
+        LIMIT 1;
+    """)
+    if cursor.fetchone() is None:
+        cursor.execute("""
+            ALTER TABLE user_data
+                ADD COLUMN updated_at TIMESTAMP(6) NOT NULL
+                    DEFAULT CURRENT_TIMESTAMP(6)
+                    ON UPDATE CURRENT_TIMESTAMP(6),
+                ADD INDEX idx_user_data_updated_at (updated_at, user_id);
+        """)
+    cursor.close()
+
+def read_csv_chunks(filename, chunk_size):
+    """Yield lists of at most chunk_size (user_id, name, email, age) tuples."""
+    with open(filename, newline='') as csvfile:
+        rows = (
+            (str(uuid.uuid4()), row["name"], row["email"], row["age"])
+            for row in csv.DictReader(csvfile)
+        )
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+def bulk_insert_data(connection, filename, batch_size=1000,
+                     transaction_size=10000):
+    """Load a users CSV in batches, skipping emails that already exist.
+
+    The CSV is streamed in batch_size chunks, each sent as one multi-row
+    INSERT IGNORE through executemany; the unique email index does the
+    dedup server-side. A commit is issued every transaction_size rows.
+    Returns a dict of rows read/inserted and timing, or None on error.
+    """
+    read = inserted = pending = 0
+    start = time.perf_counter()
+    try:
+        ensure_email_unique(connection)
+        cursor = connection.cursor()
+        for chunk in read_csv_chunks(filename, batch_size):
+            cursor.executemany("""
+                INSERT IGNORE INTO user_data (user_id, name, email, age)
+                VALUES (%s, %s, %s, %s);
+            """, chunk)
+            inserted += cursor.rowcount
+            read += len(chunk)
+            pending += len(chunk)
+            if pending >= transaction_size:
+                connection.commit()
+                pending = 0
+        connection.commit()
+        cursor.close()
+    except Exception as err:
+        connection.rollback()
+        print(f"Error bulk inserting data: {err}")
+        return None
+
+    elapsed = time.perf_counter() - start
+    rate = read / elapsed if elapsed else 0.0
+    print(f"Inserted {inserted} of {read} rows in {elapsed:.2f}s "
+          f"({rate:.0f} rows/sec)")
+    return {"read": read, "inserted": inserted, "seconds": elapsed,
+            "rows_per_sec": rate}
         
 def stream_user_data(connection):
     try:
         cursor = connection.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM user_data;")
+        cursor.execute(USER_DATA_SELECT)
         while True:
             row = cursor.fetchone()
             if row is None: